@@ -28,6 +28,7 @@ class HaystackFilter(BaseFilterBackend):
     '''
     reserved_params = [settings.REST_FRAMEWORK['PAGINATE_BY_PARAM'], 
                        settings.REST_FRAMEWORK['PAGINATE_PARAM'],
+                       settings.REST_FRAMEWORK['CURSOR_PARAM'],
                        settings.REST_FRAMEWORK['ORDER_BY_PARAM'], 
                        settings.REST_FRAMEWORK['SEARCH_PARAM'], 
                        settings.REST_FRAMEWORK['SEARCHTYPE_PARAM'], 'format']
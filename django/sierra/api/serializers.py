@@ -92,21 +92,7 @@ class ItemSerializer(SimpleSerializerWithLookups):
         return parser.camel_to_underscore(field_name)
 
     def cache_all_lookups(self):
-        types = ['Location', 'ItemStatus', 'Itype']
-        qs = solr.Queryset(page_by=1000).filter(type__in=types)
-        qs = qs.only('type', 'code', 'label')
-        results = [i for i in qs]
-        
-        lookups = {'Location': {}, 'ItemStatus': {}, 'Itype': {}}
-        for r in results:
-            try:
-                lookups[r['type']][r['code']] = r['label']
-            except KeyError:
-                try:
-                    lookups[r['type']][r['code']] = None
-                except KeyError:
-                    pass
-
+        lookups = solr.get_lookups(['Location', 'ItemStatus', 'Itype'])
         self.cache_lookup('location', lookups['Location'])
         self.cache_lookup('status', lookups['ItemStatus'])
         self.cache_lookup('item_type', lookups['Itype'])
@@ -2,7 +2,7 @@ from collections import OrderedDict, Sequence
 
 import django.db.models.query
 
-from utils import solr
+from utils import solr, helpers
 
 import logging
 
@@ -51,6 +51,7 @@ class SimpleSerializer(object):
     derived is not provided, it defaults to False.
     '''
     fields = OrderedDict()
+    atomic_updates = False
 
     def __init__(self, instance=None, data=None, context=None):
         self.context = context or {}
@@ -192,6 +193,14 @@ class SimpleSerializer(object):
                 if obj_fname not in populated_fields:
                     new_obj_data[obj_fname] = obj_val
 
+            self.changed_fields = []
+            for fname, fsettings in self.fields.iteritems():
+                obj_fname = fsettings.get('source', fname)
+                if (fsettings.get('writable', False) and
+                        new_obj_data.get(obj_fname, None) !=
+                        old_obj_dict.get(obj_fname, None)):
+                    self.changed_fields.append(obj_fname)
+
         return solr.Result(new_obj_data)
 
     def from_native(self, data):
@@ -231,9 +240,19 @@ class SimpleSerializer(object):
         The object your saving should have a save method on it.
         Override this as needed based on whatever type of object you're
         serializing.
+
+        If atomic_updates is True on your class, only the writable
+        fields that actually changed are saved, by passing them as
+        the "fields" kwarg to the object's save method (e.g., see
+        utils.solr.Result.save); if nothing changed, nothing is saved.
         '''
         self._data = None
-        self.object.save(**kwargs)
+        changed_fields = getattr(self, 'changed_fields', None)
+        if self.atomic_updates and changed_fields is not None:
+            if changed_fields:
+                self.object.save(fields=changed_fields, **kwargs)
+        else:
+            self.object.save(**kwargs)
 
     def replace_data(self, data):
         self.init_data = data
@@ -249,15 +268,41 @@ class SimpleSerializerWithLookups(SimpleSerializer):
     To use, your child class should override the cache_all_lookups
     and cache_all_db_objects methods to specify how lookup values are
     derived. (Note that both are optional.)
+
+    Cached values persist across requests, in bounded LRU caches
+    (utils.helpers.LRUCache) that belong to each serializer class.
+    Set lookup_cache_size and db_cache_size on your child class to
+    change how many lookup tables and DB values it keeps. Use
+    cache_info to see how big the caches are and how often they hit.
     '''
-    _lookup_cache = {}
-    _db_cache = {}
-    
+    lookup_cache_size = 100
+    db_cache_size = 10000
+
     def __init__(self, *args, **kwargs):
         super(SimpleSerializerWithLookups, self).__init__(*args, **kwargs)
         self.cache_all_lookups()
         self.cache_all_db_objects()
 
+    @classmethod
+    def get_cache(cls, name):
+        '''
+        Returns this class's LRUCache for the given name ('lookup' or
+        'db'), creating it if needed. Caches are stored in the class's
+        own __dict__ so that subclasses never share them.
+        '''
+        attr = '_{}_cache'.format(name)
+        cache = cls.__dict__.get(attr, None)
+        if cache is None:
+            maxsize = getattr(cls, '{}_cache_size'.format(name))
+            cache = helpers.LRUCache(maxsize=maxsize)
+            setattr(cls, attr, cache)
+        return cache
+
+    @classmethod
+    def cache_info(cls):
+        return {'lookup': cls.get_cache('lookup').info(),
+                'db': cls.get_cache('db').info()}
+
     def cache_all_lookups(self):
         '''
         Child classes should implement this method to load all lookup
@@ -288,23 +333,17 @@ class SimpleSerializerWithLookups(SimpleSerializer):
                     keys}).prefetch_related(*prefetch)
 
     def cache_lookup(self, fname, values):
-        self._lookup_cache[fname] = values
+        self.get_cache('lookup').set(fname, values)
 
     def get_lookup_value(self, fname, lookup_code):
         try:
-            ret_val = self._lookup_cache[fname][lookup_code]
+            ret_val = self.get_cache('lookup').get(fname, {})[lookup_code]
         except KeyError:
             ret_val = ''
         return ret_val
 
     def cache_field(self, fname, pk, value):
-        if fname in self._db_cache:
-            self._db_cache[fname][str(pk)] = value
-        else:
-            self._db_cache[fname] = {str(pk): value}
+        self.get_cache('db').set((fname, str(pk)), value)
 
     def get_db_field_value(self, fname, pk):
-        if fname in self._db_cache and str(pk) in self._db_cache[fname]:
-            return self._db_cache[fname][str(pk)]
-        else:
-            return None
+        return self.get_cache('db').get((fname, str(pk)))
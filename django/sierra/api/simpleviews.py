@@ -1,4 +1,6 @@
 import urllib
+import base64
+import json
 from collections import OrderedDict
 import jsonpatch
 import jsonpointer
@@ -12,7 +14,7 @@ from rest_framework.templatetags.rest_framework import replace_query_param
 from rest_framework import status
 
 from api import exceptions
-from utils import load_class
+from utils import load_class, solr
 from utils.camel_case import render
 
 import logging
@@ -37,8 +39,25 @@ class SimpleView(views.APIView):
     resource_name = 'resources'
     multi = True
 
+    def initial(self, request, *args, **kwargs):
+        solr.reset_request_count()
+        super(SimpleView, self).initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        '''
+        In DEBUG mode, adds an X-Solr-Request-Count header to each
+        response showing how many Solr requests it took to build it.
+        '''
+        response = super(SimpleView, self).finalize_response(request,
+                                                    response, *args, **kwargs)
+        if settings.DEBUG:
+            response['X-Solr-Request-Count'] = solr.get_request_count()
+        return response
+
     def get_queryset(self):
-        return self.queryset
+        # Return a copy so that results cached on the queryset while
+        # handling one request don't leak into the next.
+        return self.queryset.all()
 
     def get_serializer(self, **kwargs):
         serializer = getattr(self, 'serializer', None)
@@ -84,16 +103,26 @@ class SimpleGetMixin(object):
     Simple mixin for a get view that paginates data. Instead of using a
     special serializer and Django Pagination objects, this uses the
     more standard offset/limit parameters.
+
+    Clients that want to page through an entire result set can instead
+    pass a cursor parameter (e.g. cursor=* for the first page) and then
+    follow the "next" links, which stay fast no matter how deep they
+    go. See paginate_by_cursor.
     '''
     def paginate(self, queryset, request):
         # first get paging parameters.
         limit_p = settings.REST_FRAMEWORK.get('PAGINATE_BY_PARAM', 'limit')
         offset_p = settings.REST_FRAMEWORK.get('PAGINATE_PARAM', 'offset')
+        cursor_p = settings.REST_FRAMEWORK.get('CURSOR_PARAM', 'cursor')
         max_limit = settings.REST_FRAMEWORK.get('MAX_PAGINATE_BY', 500)
         default_limit = settings.REST_FRAMEWORK.get('PAGINATE_BY', 10)
         offset = int(request.QUERY_PARAMS.get(offset_p, 0))
         limit = int(request.QUERY_PARAMS.get(limit_p, default_limit))
         limit = max_limit if limit > max_limit else limit
+        if cursor_p in request.QUERY_PARAMS:
+            return self.paginate_by_cursor(queryset, request, limit)
+        # Slicing the queryset gets the page and the total count in one
+        # Solr request; count() then uses the count from that response.
         page = queryset[offset:offset+limit]
 
         # make sure the end row num is not > the total count of the queryset
@@ -152,6 +181,68 @@ class SimpleGetMixin(object):
 
         return page_data
 
+    def paginate_by_cursor(self, queryset, request, limit):
+        '''
+        Alternative to offset/limit paging, for clients (like
+        harvesters) that want to walk through a whole result set.
+        The cursor parameter is an opaque string: * gets the first
+        page, and each page links to the next one. Each page is a
+        keyset query (see utils.solr.Queryset.keyset_page), so the
+        last page is as fast as the first. Only querysets that have a
+        keyset_page method (i.e. Solr querysets) can be paged this way,
+        and only when sorted on fields where records with no value sort
+        last.
+        '''
+        cursor_p = settings.REST_FRAMEWORK.get('CURSOR_PARAM', 'cursor')
+        limit_p = settings.REST_FRAMEWORK.get('PAGINATE_BY_PARAM', 'limit')
+        if not hasattr(queryset, 'keyset_page'):
+            raise exceptions.BadQuery(detail='The {} parameter is not '
+                                      'supported for this resource.'
+                                      ''.format(cursor_p))
+        if limit < 1:
+            raise exceptions.BadQuery(detail='The {} parameter must be at '
+                                      'least 1 when using {}.'
+                                      ''.format(limit_p, cursor_p))
+        cursor = request.QUERY_PARAMS.get(cursor_p, '*')
+        if cursor in ('', '*'):
+            cursor = None
+        else:
+            try:
+                cursor = json.loads(base64.urlsafe_b64decode(
+                                    cursor.encode('ascii')))
+            except (TypeError, ValueError):
+                cursor = None
+            if not isinstance(cursor, dict):
+                raise exceptions.BadQuery(detail='Invalid cursor.')
+
+        try:
+            page, next_cursor = queryset.keyset_page(cursor, limit)
+        except ValueError as e:
+            # keyset_page checks the cursor and the sort fields before
+            # querying Solr.
+            raise exceptions.BadQuery(detail=unicode(e))
+        url = request.build_absolute_uri()
+        next_page = None
+        if next_cursor is not None:
+            next_cursor = base64.urlsafe_b64encode(json.dumps(next_cursor))
+            next_page = urllib.unquote(replace_query_param(url, cursor_p,
+                                                           next_cursor))
+
+        resource_name = render.underscoreToCamel(self.resource_name)
+        resource_list = self.get_serializer(instance=page, force_refresh=True,
+                                            context={'request': request,
+                                                     'view': self}).data
+
+        page_data = OrderedDict()
+        page_data['_links'] = OrderedDict()
+        page_data['_links']['self'] = {'href': url}
+        if next_page is not None:
+            page_data['_links']['next'] = {'href': next_page}
+        if resource_list:
+            page_data['_embedded'] = {resource_name: resource_list}
+
+        return page_data
+
     def get(self, request, *args, **kwargs):
         if self.multi:
             queryset = self.get_queryset()
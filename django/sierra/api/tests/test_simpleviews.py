@@ -0,0 +1,90 @@
+"""
+Tests classes and functions in `api.simpleviews`.
+"""
+
+import base64
+import json
+
+import pytest
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api import simpleviews, exceptions
+from utils import solr
+
+
+# FIXTURES AND TEST DATA
+# Fixtures used in the below tests can be found in
+# django/sierra/conftest.py: solr_conn
+
+class ListView(simpleviews.SimpleGetMixin):
+    resource_name = 'items'
+
+
+@pytest.fixture
+def paginate():
+    """
+    Returns a function that paginates the given queryset using the
+    given query string, via SimpleGetMixin.paginate.
+    """
+    def _paginate(queryset, query_string):
+        request = Request(APIRequestFactory().get('/?{}'.format(
+                                                  query_string)))
+        return ListView().paginate(queryset, request)
+    return _paginate
+
+
+def encode_cursor(cursor):
+    return base64.urlsafe_b64encode(json.dumps(cursor))
+
+
+# TESTS
+
+def test_cursor_paging_rejects_non_solr_querysets(paginate):
+    """
+    Cursor paging only works for Solr querysets, so asking for a
+    cursor on any other kind of queryset should be a BadQuery.
+    """
+    with pytest.raises(exceptions.BadQuery):
+        paginate([1, 2, 3], 'cursor=*')
+
+
+@pytest.mark.parametrize('limit', [0, -1])
+def test_cursor_paging_rejects_limits_below_one(limit, paginate):
+    """
+    Cursor paging with a limit below 1 should be a BadQuery.
+    """
+    with pytest.raises(exceptions.BadQuery):
+        paginate(solr.Queryset(conn=object()),
+                 'cursor=*&limit={}'.format(limit))
+
+
+@pytest.mark.parametrize('cursor', [
+    'notacursor',
+    encode_cursor(['last']),
+    encode_cursor({}),
+    encode_cursor({'last': {'call_number_sort': 'A'}}),
+    encode_cursor({'last': {'haystack_id': 'x', 'call_number_sort': {}}}),
+    encode_cursor({'last': {'haystack_id': 'x', 'volume_sort': 'A'}}),
+])
+def test_cursor_paging_rejects_invalid_cursors(cursor, paginate):
+    """
+    Cursors that aren't ones we returned for the queryset being paged
+    should be a BadQuery rather than an error from deep inside the
+    keyset query.
+    """
+    qs = solr.Queryset(conn=object()).order_by('call_number_sort')
+    with pytest.raises(exceptions.BadQuery):
+        paginate(qs, 'cursor={}'.format(cursor))
+
+
+def test_cursor_paging_rejects_sorts_without_missing_last(paginate,
+                                                          solr_conn):
+    """
+    Cursor paging can't walk a sort where records missing a value
+    don't sort last, so sorting on such a field should be a BadQuery
+    rather than a page set that repeats or skips records.
+    """
+    qs = solr.Queryset(conn=solr_conn('haystack')).order_by('title_t')
+    with pytest.raises(exceptions.BadQuery):
+        paginate(qs, 'cursor=*')
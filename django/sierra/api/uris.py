@@ -101,6 +101,7 @@ class APIUris(Uris):
         'callnumbermatches-list': [r'v', {'v': r'1'}, r'/callnumbermatches/'],
         'firstitemperlocation-list': [r'v', {'v': r'1'}, 
                                     r'/firstitemperlocation/'],
+        'shelfbrowse-list': [r'v', {'v': r'1'}, r'/shelfbrowse/'],
         'eresources-list': [r'v', {'v': r'1'}, r'/eresources/'],
         'eresources-detail': [r'v', {'v': r'1'}, r'/eresources/', {'id': ''}],
     }
\ No newline at end of file
@@ -53,6 +53,8 @@ urlpatterns = patterns('',
     url(APIUris.get_urlpattern('firstitemperlocation-list', v=r'1'),
         views.FirstItemPerLocationList.as_view(), 
         name='firstitemperlocation-list'),
+    url(APIUris.get_urlpattern('shelfbrowse-list', v=r'1'),
+        views.ShelfBrowseList.as_view(), name='shelfbrowse-list'),
 )
 
 urlpatterns = format_suffix_patterns(urlpatterns, allowed=['json', 'html'])
\ No newline at end of file
@@ -1,3 +1,4 @@
+import urllib
 from datetime import datetime
 from collections import OrderedDict
 
@@ -9,10 +10,13 @@ from django.contrib.auth.models import User
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import permissions
+from rest_framework.templatetags.rest_framework import replace_query_param
 
 from .simpleviews import SimpleView, SimpleGetMixin
-from utils import solr
+from utils import solr, helpers
+from base import search_indexes as indexes
 from . import serializers
+from . import exceptions
 from . import filters
 from .uris import APIUris
 
@@ -71,6 +75,10 @@ def api_root(request):
             'href': APIUris.get_uri('firstitemperlocation-list', req=request,
                                     absolute=True)
         },
+        'shelfbrowse': {
+            'href': APIUris.get_uri('shelfbrowse-list', req=request,
+                                    absolute=True)
+        },
     }
     ret_val = OrderedDict()
     ret_val['catalogApi'] = OrderedDict()
@@ -368,8 +376,13 @@ class CallnumbermatchesList(SimpleGetMixin, SimpleView):
     You can filter using the
     following fields: callNumber, locationCode, and callNumberType.
     '''
-    queryset = solr.Queryset().filter(type='Item').only(
-                'call_number').order_by('call_number_sort')
+    # A pivot facet on call_number_sort then call_number gets us the
+    # distinct call numbers, in call number order, in one request--no
+    # matter how many items share each call number.
+    pivot = 'call_number_sort,call_number'
+    queryset = solr.Queryset().filter(type='Item').search('*:*',
+        params={'facet': 'true', 'facet.pivot': pivot, 'facet.sort': 'index',
+                'facet.mincount': 1, 'facet.pivot.mincount': 1})
     serializer_class = serializers.ItemSerializer
     resource_name = 'callnumber_matches'
     filter_fields = ['call_number', 'location_code', 'call_number_type']
@@ -381,59 +394,195 @@ class CallnumbermatchesList(SimpleGetMixin, SimpleView):
         default_limit = settings.REST_FRAMEWORK.get('PAGINATE_BY', 10)
         limit = int(request.QUERY_PARAMS.get(limit_p, default_limit))
         limit = max_limit if limit > max_limit else limit
-        data, i, count = [], 0, queryset.count()
-        while len(data) < limit and i < count:
-            call_number = queryset[i].get('call_number', None)
-            if call_number is not None and call_number not in data:
-                data.append(call_number)
-            i += 1
 
-        return data
+        queryset = queryset._clone()
+        queryset._search_params['facet.limit'] = limit
+        pivots = queryset.full_response.facets.get('facet_pivot', {})
+        data = []
+        for sort_facet in pivots.get(self.pivot, []):
+            for cn_facet in sort_facet.get('pivot', []):
+                call_number = cn_facet.get('value', None)
+                if call_number is not None and call_number not in data:
+                    data.append(call_number)
+            if len(data) >= limit:
+                break
+
+        return data[:limit]
 
 class FirstItemPerLocationList(SimpleGetMixin, SimpleView):
     '''
     Returns the first item (by call number) for each location within a
-    filtered result set.
-    '''
-    facet_field = 'location_code'
+    filtered result set. Use offset and limit to page through
+    locations; by default, up to MAX_PAGINATE_BY locations are shown.
+    '''
+    group_field = 'location_code'
+    fields = ['id', 'parent_bib_title', 'parent_bib_record_number',
+              'call_number', 'barcode', 'record_number', 'call_number_type']
+    # Solr result grouping gets us the first item for each location
+    # (and the number of locations) in one request.
     queryset = solr.Queryset().filter(type='Item').search('*:*', 
-        params={'facet': 'true', 'facet.field': facet_field, 
-                'facet.sort': 'index', 'facet.mincount': 1})
+        params={'group': 'true', 'group.field': group_field,
+                'group.sort': 'call_number_sort asc', 'group.limit': 1,
+                'group.ngroups': 'true', 'sort': '{} asc'.format(group_field)}
+        ).only(*fields)
     serializer_class = serializers.ItemSerializer
     filter_fields = ['call_number', 'call_number_type', 'barcode']
 
     def paginate(self, queryset, request):
-        ff = self.facet_field
-        facets = queryset.full_response.facets['facet_fields'][ff]
-        fields = ['id', 'parent_bib_title', 'parent_bib_record_number',
-                  'call_number', 'barcode', 'record_number', 'call_number_type']
-        total_count = len(facets) / 2
+        limit_p = settings.REST_FRAMEWORK.get('PAGINATE_BY_PARAM', 'limit')
+        offset_p = settings.REST_FRAMEWORK.get('PAGINATE_PARAM', 'offset')
+        max_limit = settings.REST_FRAMEWORK.get('MAX_PAGINATE_BY', 500)
+        offset = int(request.QUERY_PARAMS.get(offset_p, 0))
+        limit = int(request.QUERY_PARAMS.get(limit_p, max_limit))
+        limit = max_limit if limit > max_limit else limit
+
+        queryset[offset:offset+limit]
+        grouped = queryset.full_response.grouped.get(self.group_field, {})
+        total_count = grouped.get('ngroups', 0)
         items = []
 
-        for key in facets[0:len(facets):2]:
-            facet_qs = solr.Queryset()
-            facet_qs._search_params['fq'] = queryset._search_params['fq']
-            facet_qs = facet_qs.filter(**{ff: key})
-            facet_qs = facet_qs.order_by('call_number_sort').only(*fields)
-            item_uri = APIUris.get_uri('items-detail', id=facet_qs[0]['id'],
+        for group in grouped.get('groups', []):
+            key = group.get('groupValue', None)
+            docs = group.get('doclist', {}).get('docs', [])
+            if key is None or not docs:
+                continue
+            item = docs[0]
+            item_uri = APIUris.get_uri('items-detail', id=item['id'],
                                        req=request, absolute=True)
             items.append({
                 '_links': { 'self': { 'href': item_uri } },
-                'id': facet_qs[0].get('id', None),
+                'id': item.get('id', None),
                 'parentBibRecordNumber': 
-                    facet_qs[0].get('parent_bib_record_number', None),
-                'parentBibTitle': facet_qs[0].get('parent_bib_title', None),
-                'recordNumber':
-                    facet_qs[0].get('record_number', None),
-                'callNumber': facet_qs[0].get('call_number', None),
-                'callNumberType': facet_qs[0].get('call_number_type', None),
-                'barcode': facet_qs[0].get('barcode', None),
+                    item.get('parent_bib_record_number', None),
+                'parentBibTitle': item.get('parent_bib_title', None),
+                'recordNumber': item.get('record_number', None),
+                'callNumber': item.get('call_number', None),
+                'callNumberType': item.get('call_number_type', None),
+                'barcode': item.get('barcode', None),
                 'locationCode': key,
             })
 
+        url = request.build_absolute_uri()
         data = OrderedDict()
         data['totalCount'] = total_count
-        data['_links'] = {'self': request.build_absolute_uri()}
+        data['_links'] = OrderedDict()
+        data['_links']['self'] = {'href': url}
+        if offset > 0:
+            prev_offset = offset - limit if offset - limit >= 0 else 0
+            data['_links']['previous'] = {'href': urllib.unquote(
+                replace_query_param(url, offset_p, prev_offset))}
+        if offset + limit < total_count:
+            data['_links']['next'] = {'href': urllib.unquote(
+                replace_query_param(url, offset_p, offset + limit))}
         data['_embedded'] = {'items': items}
 
         return data
+
+
+class ShelfBrowseList(SimpleView):
+    '''
+    Browse items in call number order, as if scanning a shelf. Use
+    itemId to see the items on either side of a given item, or
+    callNumber (plus callNumberType, which defaults to lc) to see the
+    items on either side of where that call number would be shelved.
+    Use before and after to set how many items to show on each side.
+    anchorIndex gives the position of the requested item, or of the
+    first item shelved at or after the requested call number.
+    '''
+    queryset = solr.Queryset().filter(type='Item')
+    serializer_class = serializers.ItemSerializer
+    resource_name = 'items'
+    # Neighbor lookups use the ordered (call number, item id) index
+    # that the item exporter maintains in Redis, so they don't require
+    # range queries or deep paging in Solr.
+    browse_index = indexes.ItemIndex.browse_index
+
+    def get_int_param(self, request, name, default, max_value):
+        try:
+            value = int(request.QUERY_PARAMS.get(name, default))
+        except ValueError:
+            msg = 'The \'{}\' parameter must be an integer.'.format(name)
+            raise exceptions.BadQuery(detail=msg)
+        return max(min(value, max_value), 0)
+
+    def get_neighbors(self, request, before, after):
+        '''
+        Returns a tuple (prev_keys, next_keys, has_previous, has_next):
+        the (sort key, item id) pairs to show before and at/after the
+        requested position, and whether there are more items beyond
+        them on each side. One extra neighbor is fetched on each side
+        to tell.
+        '''
+        item_id = request.QUERY_PARAMS.get('itemId', None)
+        call_number = request.QUERY_PARAMS.get('callNumber', None)
+        next_size = after
+        if item_id is not None:
+            sort_key = self.browse_index.get_sort_key(item_id)
+            if sort_key is None:
+                raise Http404
+            neighbors = self.browse_index.neighbors(item_id, before + 1,
+                                                    after + 1, sort_key[:1])
+            if neighbors is None:
+                # The item left the index since we got its sort key.
+                raise Http404
+            prev_keys, next_keys = neighbors
+            next_keys = [(sort_key, item_id)] + next_keys
+            next_size = after + 1
+        elif call_number is not None:
+            cn_type = request.QUERY_PARAMS.get('callNumberType', 'lc')
+            try:
+                cn_sort = helpers.NormalizedCallNumber(call_number,
+                                                       cn_type).normalize()
+            except helpers.CallNumberError:
+                cn_sort = helpers.NormalizedCallNumber(call_number,
+                                                       'other').normalize()
+            prev_keys, next_keys = self.browse_index.around(
+                (cn_type, cn_sort), before + 1, after + 1, (cn_type,))
+        else:
+            msg = ('Either an \'itemId\' or a \'callNumber\' parameter is '
+                   'required.')
+            raise exceptions.BadQuery(detail=msg)
+        return (prev_keys[len(prev_keys) - before:] if before else [],
+                next_keys[:next_size], len(prev_keys) > before,
+                len(next_keys) > next_size)
+
+    def get(self, request, *args, **kwargs):
+        max_limit = settings.REST_FRAMEWORK.get('MAX_PAGINATE_BY', 500)
+        default_limit = settings.REST_FRAMEWORK.get('PAGINATE_BY', 10)
+        before = self.get_int_param(request, 'before', default_limit,
+                                    max_limit)
+        after = self.get_int_param(request, 'after', default_limit,
+                                   max_limit)
+        prev_keys, next_keys, has_previous, has_next = self.get_neighbors(
+            request, before, after)
+
+        # Fetch all of the items in one Solr request, then put them in
+        # shelf order. Ids that have since left Solr are skipped.
+        ids = [item_id for sort_key, item_id in prev_keys + next_keys]
+        results = {}
+        if ids:
+            queryset = self.get_queryset().filter(id__in=ids)
+            results = {str(r['id']): r for r in queryset[0:len(ids)]}
+        items = [results[i] for i in ids if i in results]
+        anchor_index = len([i for k, i in prev_keys if i in results])
+
+        browse_uri = APIUris.get_uri('shelfbrowse-list', req=request,
+                                     absolute=True)
+        data = OrderedDict()
+        data['anchorIndex'] = anchor_index
+        data['_links'] = OrderedDict()
+        data['_links']['self'] = {'href': request.build_absolute_uri()}
+        if items and has_previous and before > 0:
+            data['_links']['previous'] = {'href': '{}?{}'.format(browse_uri,
+                urllib.urlencode({'itemId': items[0]['id'],
+                                  'before': before, 'after': after}))}
+        if items and has_next and after > 0:
+            data['_links']['next'] = {'href': '{}?{}'.format(browse_uri,
+                urllib.urlencode({'itemId': items[-1]['id'],
+                                  'before': before, 'after': after}))}
+        data['_embedded'] = {
+            'items': self.get_serializer(instance=items, force_refresh=True,
+                                         context={'request': request,
+                                                  'view': self}).data
+        }
+        return Response(data)
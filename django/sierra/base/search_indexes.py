@@ -10,12 +10,16 @@ Haystack SearchIndex class.
 '''
 from __future__ import unicode_literals
 import re
+from xml.sax.saxutils import escape
 
 from haystack import indexes
+from haystack.utils import get_identifier
 
 from export import sierra2marc as s2m
+from export import metrics
 from . import models as sierra_models
 from utils import helpers
+from utils.redisobjs import RedisSortedIndex
 
 import logging
 # set up logger, for debugging
@@ -55,10 +59,21 @@ class CustomQuerySetIndex(indexes.SearchIndex):
     expose a "commit" option, which allows you to perform an update
     without committing it to Solr.
 
-    Finally, this provides commit() and optimize() methods, which allow
-    you to commit changes and optimize the index manually. May only
-    work with the solr backend.
+    Time spent preparing, posting, and committing documents is recorded
+    against the export chunk being measured, if any (see
+    export.metrics).
+
+    This provides commit() and optimize() methods, which allow you to
+    commit changes and optimize the index manually. May only work with
+    the solr backend.
+
+    Finally, remove_objects() lets you delete many objects at once,
+    sending one request to Solr per batch of remove_batch_size objects
+    rather than one request per object. Also may only work with the
+    solr backend.
     '''
+    remove_batch_size = 1000
+
     def __init__(self, *args, **kwargs):
         default_queryset = kwargs.pop('queryset', None)
         super(indexes.SearchIndex, self).__init__(*args, **kwargs)
@@ -75,7 +90,12 @@ class CustomQuerySetIndex(indexes.SearchIndex):
         backend = self._get_backend(using)
 
         if backend is not None:
-            backend.update(self, self.index_queryset(), commit=commit)
+            with metrics.timed('post'):
+                backend.update(self, self.index_queryset(), commit=commit)
+
+    def full_prepare(self, obj):
+        with metrics.timed('prepare'):
+            return super(CustomQuerySetIndex, self).full_prepare(obj)
 
     def clear(self, using=None, commit=True):
         backend = self._get_backend(using)
@@ -94,11 +114,34 @@ class CustomQuerySetIndex(indexes.SearchIndex):
             if backend is not None:
                 backend.update(self, [instance], commit=commit)
 
+    def remove_objects(self, objs_or_strings, using=None, commit=True,
+                       batch_size=None):
+        '''
+        Removes multiple objects from the index, in batches. Items in
+        objs_or_strings may be model instances or Haystack identifier
+        strings (e.g. 'base.itemrecord.1'), as with remove_object.
+        '''
+        backend = self._get_backend(using)
+        batch_size = batch_size or self.remove_batch_size
+
+        if backend is not None:
+            ids = [get_identifier(o) for o in objs_or_strings]
+            with metrics.timed('post'):
+                for start in range(0, len(ids), batch_size):
+                    batch = ids[start:start+batch_size]
+                    message = '<delete>{}</delete>'.format(''.join(
+                        ['<id>{}</id>'.format(escape(i)) for i in batch]))
+                    backend.conn._update(message, commit=False)
+            if commit:
+                with metrics.timed('commit'):
+                    backend.conn.commit()
+
     def commit(self, using=None):
         backend = self._get_backend(using)
 
         if backend is not None:
-            backend.conn.commit()
+            with metrics.timed('commit'):
+                backend.conn.commit()
 
     def optimize(self, using=None):
         backend = self._get_backend(using)
@@ -123,6 +166,12 @@ class MarcIndex(CustomQuerySetIndex, indexes.Indexable):
     '''
     Class to index MARC in Solr so that it's searchable by field and
     subfield.
+
+    Only the control fields get explicit index fields. All other MARC
+    fields and subfields go into mf_* and sf_* fields (e.g. mf_245,
+    sf_245a) that prepare adds to the document directly; the marc Solr
+    schema defines these as dynamicFields, so we don't need (and
+    shouldn't build) thousands of Haystack field objects for them.
     '''
     id = indexes.IntegerField()
     text = indexes.CharField(document=True)
@@ -131,20 +180,20 @@ class MarcIndex(CustomQuerySetIndex, indexes.Indexable):
     mf_001 = indexes.FacetCharField(stored=False)
     mf_003 = indexes.FacetCharField(stored=False)
     mf_005 = indexes.FacetCharField(stored=False)
+    mf_006 = indexes.FacetCharField(stored=False)
     mf_007 = indexes.FacetCharField(stored=False)
     mf_008 = indexes.FacetCharField(stored=False)
     json = indexes.FacetCharField()
 
     def __init__(self, *args, **kwargs):
+        '''
+        Pass marc_records, a dict mapping BibRecord pks to pymarc
+        records (e.g. S2MarcBatch.marc_records), to index records
+        that have already been converted to MARC without converting
+        them again. Bibs not in marc_records are converted as needed.
+        '''
+        self.marc_records = kwargs.pop('marc_records', None) or {}
         super(MarcIndex, self).__init__(*args, **kwargs)
-        for mf in range(10,1000):
-            setattr(self, 'mf_{:03d}'.format(mf),
-                    indexes.FacetCharField(stored=False))
-            for sf in ['0','1','2','3','4','5','6','7','8','9','a','b','c','d',
-                       'e','f','g','h','i','j','k','l','m','n','o','p','q','r',
-                       's','t','u','v','w','x','y','z']:
-                setattr(self, 'sf_{:03d}{}'.format(mf, sf),
-                        indexes.FacetCharField(stored=False))
 
     def get_model(self):
         return sierra_models.BibRecord
@@ -157,11 +206,14 @@ class MarcIndex(CustomQuerySetIndex, indexes.Indexable):
 
     def prepare(self, obj):
         self.prepared_data = super(MarcIndex, self).prepare(obj)
-        try:
-            record = s2m.S2MarcBatch(obj).to_marc()[0]
-        except IndexError:
-            pass
+        if obj.pk in self.marc_records:
+            record = self.marc_records[obj.pk]
         else:
+            try:
+                record = s2m.S2MarcBatch(obj).to_marc()[0]
+            except IndexError:
+                record = None
+        if record is not None:
             self.prepared_data['json'] = record.as_json()
             self.prepared_data['leader'] = record.leader
             for field in record.get_fields():
@@ -305,6 +357,9 @@ class ItemIndex(CustomQuerySetIndex, indexes.Indexable):
         model_attr='record_metadata__num_revisions', null=True)
     suppressed = indexes.BooleanField()
     _version_ = indexes.IntegerField()
+
+    # Ordered index of item ids by call number, for shelf browsing.
+    browse_index = RedisSortedIndex('callnumber_browse', 'items')
     
     def get_model(self):
         return sierra_models.ItemRecord
@@ -390,6 +445,26 @@ class ItemIndex(CustomQuerySetIndex, indexes.Indexable):
                 cn = helpers.NormalizedCallNumber(cn, 'other').normalize()
         return cn
 
+    def get_browse_key(self, obj):
+        '''
+        Returns the key that places this item in the call number browse
+        index (see browse_index): a (call number type, call_number_sort)
+        tuple, or None if the item has no call number.
+        '''
+        cn_sort = self.prepare_call_number_sort(obj)
+        if cn_sort is None:
+            return None
+        (cn, ctype) = self.get_call_number(obj)
+        return (ctype or 'other', cn_sort)
+
+    def update_browse_index(self, objs):
+        '''
+        Adds the given items to the call number browse index, moving
+        any whose call numbers have changed.
+        '''
+        self.browse_index.update({obj.pk: self.get_browse_key(obj)
+                                  for obj in objs})
+
     def prepare_call_number_search(self, obj):
         '''
         Prepare call_number_search field. This prepares a version of a
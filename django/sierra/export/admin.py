@@ -3,8 +3,10 @@ from django.http import HttpResponseRedirect, HttpResponse
 from django.core.urlresolvers import reverse
 from django.shortcuts import get_object_or_404, render
 from django.utils import timezone as tz
+from django.utils.html import format_html, format_html_join
 
-from .models import ExportType, ExportFilter, ExportInstance, Status
+from .models import (ExportType, ExportFilter, ExportInstance, ExportChunk,
+                     Status)
 from .forms.modelforms import ExportForm
 from .tasks import trigger_export
 
@@ -41,7 +43,7 @@ class ExportInstanceAdmin(admin.ModelAdmin):
                     'status', 'errors', 'warnings')
     readonly_fields = ('status', 'export_type', 'export_filter',
                         'filter_params', 'user', 'timestamp', 'errors',
-                        'warnings')
+                        'warnings', 'performance_summary')
     list_filter = ('user', 'status', 'export_type',)
     ordering = ('-timestamp',)
     change_list_template = 'admin/export_instance_changelist.html'
@@ -51,6 +53,78 @@ class ExportInstanceAdmin(admin.ModelAdmin):
             'all': ('export/admin_styles.css',)
         }
 
+    def performance_summary(self, obj):
+        '''
+        Shows totals of the per-chunk metrics (ExportChunk) for this
+        job, with the share of time each phase took, followed by the
+        same breakdown for each exporter and chunk type, so we can see
+        where the job spent its time.
+        '''
+        summary = obj.get_chunk_summary()
+        if not summary['chunks']:
+            return 'No metrics recorded.'
+        total_time = summary['total_time'] or 0
+        rows = [
+            ('Chunks', summary['chunks']),
+            ('Rows processed', summary['rows'] or 0),
+            ('Total time (summed across workers)',
+             '{:.2f}s'.format(total_time)),
+        ]
+        phase_time = 0
+        for phase in ('fetch', 'prepare', 'post', 'commit'):
+            secs = summary['{}_time'.format(phase)] or 0
+            phase_time += secs
+            rows.append(('{} time'.format(phase.capitalize()),
+                         self._format_time(secs, total_time)))
+        rows.append(('Other time',
+                     self._format_time(max(total_time - phase_time, 0),
+                                       total_time)))
+        rows.append(('SQL queries', summary['query_count'] or 0))
+        if summary['records_per_second'] is not None:
+            rows.append(('Records per second (per worker)',
+                         '{:.1f}'.format(summary['records_per_second'])))
+        if summary['peak_rss'] is not None:
+            rows.append(('Worker peak RSS (over the process lifetime)',
+                         '{} KB'.format(summary['peak_rss'])))
+        return format_html('<table>{}</table>{}', format_html_join('',
+                           '<tr><th>{}</th><td>{}</td></tr>', rows),
+                           self._format_breakdown(summary['breakdown']))
+    performance_summary.allow_tags = True
+
+    def _format_breakdown(self, breakdown):
+        '''
+        Renders a table of phase times for each exporter and chunk
+        type in a chunk summary's breakdown, with the slowest phase
+        for each.
+        '''
+        phases = ('fetch', 'prepare', 'post', 'commit')
+        header = ['Exporter', 'Chunk type', 'Chunks', 'Rows', 'Queries']
+        header += [p.capitalize() for p in phases] + ['Other', 'Total',
+                                                      'Slowest phase']
+        rows = []
+        for group in breakdown:
+            total_time = group['total_time'] or 0
+            times = [(p, group['{}_time'.format(p)] or 0) for p in phases]
+            times.append(('other',
+                          max(total_time - sum(t for p, t in times), 0)))
+            row = [group['exporter'] or 'Unknown', group['chunk_type'],
+                   group['chunks'], group['rows'] or 0,
+                   group['query_count'] or 0]
+            row += [self._format_time(t, total_time) for p, t in times]
+            row += ['{:.2f}s'.format(total_time),
+                    max(times, key=lambda t: t[1])[0]]
+            rows.append(format_html_join('', '<td>{}</td>',
+                                         [(cell,) for cell in row]))
+        return format_html('<table><tr>{}</tr>{}</table>',
+                           format_html_join('', '<th>{}</th>',
+                                            [(h,) for h in header]),
+                           format_html_join('', '<tr>{}</tr>',
+                                            [(r,) for r in rows]))
+
+    def _format_time(self, secs, total_time):
+        pct = secs / total_time * 100 if total_time else 0
+        return '{:.2f}s ({:.0f}%)'.format(secs, pct)
+
     def add_view(self, request, form_url='', extra_content=None):
         model = self.model
         opts = model._meta
@@ -88,7 +162,17 @@ class StatusAdmin(admin.ModelAdmin):
     list_display = ('code', 'label')
 
 
+class ExportChunkAdmin(admin.ModelAdmin):
+    list_display = ('instance', 'exporter', 'chunk_type', 'start', 'end',
+                    'rows', 'total_time', 'fetch_time', 'prepare_time',
+                    'post_time', 'commit_time', 'query_count', 'peak_rss',
+                    'errors', 'warnings')
+    list_filter = ('instance__export_type', 'exporter', 'chunk_type')
+    ordering = ('-timestamp',)
+
+
 admin.site.register(ExportType, ExportTypeAdmin)
 admin.site.register(ExportFilter, ExportFilterAdmin)
 admin.site.register(ExportInstance, ExportInstanceAdmin)
+admin.site.register(ExportChunk, ExportChunkAdmin)
 admin.site.register(Status, StatusAdmin)
\ No newline at end of file
@@ -10,8 +10,6 @@ from __future__ import unicode_literals
 import logging
 import sys, traceback
 import re
-import subprocess
-import os
 
 from django.conf import settings
 
@@ -19,6 +17,8 @@ from base import models as sierra_models
 from base import search_indexes as indexes
 from export import models as export_models
 from . import exporter
+from . import metrics
+from . import solrmarc
 from .sierra2marc import S2MarcError, S2MarcBatch
 from utils import helpers, redisobjs, solr, dict_merge
 
@@ -43,6 +43,7 @@ class MetadataToSolrExporter(exporter.Exporter):
     model_name = ''
     hs_conn = None
     index_class = None
+    uses_records = False
     
     def __init__(self, *args, **kwargs):
         c_name = self.__class__.__name__
@@ -61,10 +62,14 @@ class MetadataToSolrExporter(exporter.Exporter):
         # call to the indexer and the indexer grabs the records
         # straight from the model. We still define the get_records
         # method because this gives our export dispatcher task a 
-        # record count which it logs on the export instance.
+        # record count which it logs on the export instance. Since
+        # the export task doesn't fetch the records, the rows for the
+        # chunk's metrics are counted here.
         log_label = self.__class__.__name__
         try:
-            self.index_class().reindex(using=self.hs_conn, commit=False)
+            index = self.index_class()
+            index.reindex(using=self.hs_conn, commit=False)
+            metrics.add_rows(index.index_queryset(using=self.hs_conn).count())
         except Exception as e:
             ex_type, ex, tb = sys.exc_info()
             logger.info(traceback.extract_tb(tb))
@@ -75,6 +80,7 @@ class MetadataToSolrExporter(exporter.Exporter):
         self.log('Info', 'Committing updates to Solr...')
         index = self.index_class()
         index.commit(using=self.hs_conn)
+        solr.clear_lookups()
 
 
 class LocationsToSolr(MetadataToSolrExporter):
@@ -130,6 +136,8 @@ class ItemsToSolr(exporter.Exporter):
         index = self.index_class(queryset=records)
         try:
             index.update(using=self.hs_conn, commit=True)
+            # records is already evaluated, so this doesn't hit the db.
+            index.update_browse_index(records)
         except Exception as e:
             ex_type, ex, tb = sys.exc_info()
             logger.info(traceback.extract_tb(tb))
@@ -139,15 +147,14 @@ class ItemsToSolr(exporter.Exporter):
     def delete_records(self, records, vals={}):
         log_label = self.__class__.__name__
         index = self.index_class()
-        for i in records:
-            try:
-                index.remove_object('base.itemrecord.{}'.format(str(i.id)),
-                                    using=self.hs_conn, commit=True)
-            except Exception as e:
-                ex_type, ex, tb = sys.exc_info()
-                logger.info(traceback.extract_tb(tb))
-                self.log('Error', 'Record {}: {}'
-                         ''.format(str(i), e), log_label)
+        ids = ['base.itemrecord.{}'.format(str(i.id)) for i in records]
+        try:
+            index.remove_objects(ids, using=self.hs_conn, commit=False)
+            index.browse_index.remove([i.id for i in records])
+        except Exception as e:
+            ex_type, ex, tb = sys.exc_info()
+            logger.info(traceback.extract_tb(tb))
+            self.log('Error', e, log_label)
         return vals
 
     def final_callback(self, vals={}, status='success'):
@@ -197,15 +204,13 @@ class EResourcesToSolr(exporter.Exporter):
     def delete_records(self, records, vals={}):
         log_label = self.__class__.__name__
         index = self.index_class()
-        for i in records:
-            try:
-                index.remove_object('base.resourcerecord.{}'.format(str(i.id)),
-                                    using=self.hs_conn, commit=False)
-            except Exception as e:
-                ex_type, ex, tb = sys.exc_info()
-                logger.info(traceback.extract_tb(tb))
-                self.log('Error', 'Record {}: {}'
-                         ''.format(str(i), e), log_label)
+        ids = ['base.resourcerecord.{}'.format(str(i.id)) for i in records]
+        try:
+            index.remove_objects(ids, using=self.hs_conn, commit=False)
+        except Exception as e:
+            ex_type, ex, tb = sys.exc_info()
+            logger.info(traceback.extract_tb(tb))
+            self.log('Error', e, log_label)
         return vals
 
     def final_callback(self, vals={}, status='success'):
@@ -214,20 +219,20 @@ class EResourcesToSolr(exporter.Exporter):
 
         self.log('Info', 'Committing updates to Solr and Redis...')
 
+        # Only the holdings for the eresources we just indexed change,
+        # so we update only those entries in the reverse holdings list
+        # rather than rewriting the whole thing.
         rev_handler = redisobjs.RedisObject('reverse_holdings_list', '0')
-        reverse_holdings_list = rev_handler.get() or {}
+        reverse_holdings_list = {}
         for er_rec_num, h_list in vals.get('h_lists', {}).iteritems():
             er_handler = redisobjs.RedisObject('eresource_holdings_list',
                                                er_rec_num)
-            er_handler.set(h_list)
+            er_handler.update_list(h_list)
 
             for h_rec_num in h_list:
                 reverse_holdings_list[h_rec_num] = er_rec_num
-            
-            #self.log('Info', 'Number of holdings in reverse_holdings_list: {}'
-            #                  .format(len(reverse_holdings_list.keys())))
 
-        rev_handler.set(reverse_holdings_list)
+        rev_handler.set_fields(reverse_holdings_list)
 
         index = self.index_class()
         index.commit(using=self.hs_conn)
@@ -267,6 +272,7 @@ class HoldingUpdate(exporter.Exporter):
         'resourcerecord_set__record_metadata__varfield_set',
         'resourcerecord_set__holding_records'
     ]
+    solr_batch_size = 100
 
     def __init__(self, *args, **kwargs):
         super(HoldingUpdate, self).__init__(*args, **kwargs)
@@ -274,23 +280,44 @@ class HoldingUpdate(exporter.Exporter):
         self.eresources_to_solr = er_et.get_exporter_class()
         self.max_rec_chunk = self.eresources_to_solr.max_rec_chunk
 
+    def get_solr_records(self, er_rec_nums):
+        '''
+        Fetches the Solr records for a list of eresource record
+        numbers, solr_batch_size at a time. Returns a dict mapping
+        record numbers to solr.Result objects. Record numbers that
+        aren't in Solr are left out.
+        '''
+        er_rec_nums = list(er_rec_nums)
+        fields = (settings.HAYSTACK_ID_FIELD, 'record_number', 'holdings')
+        records = {}
+        for i in range(0, len(er_rec_nums), self.solr_batch_size):
+            batch = er_rec_nums[i:i+self.solr_batch_size]
+            qs = solr.Queryset().filter(record_number__in=batch)
+            for r in qs.only(*fields)[0:len(batch)]:
+                records[r['record_number']] = r
+        return records
+
     def export_records(self, records, vals={}):
         log_label = self.__class__.__name__
         eresources = set()
         er_mapping = {}
+        er_objects = {}
         # First we loop through the holding records and determine which
         # eresources need to be updated. er_mapping maps eresource rec
         # nums to lists of holdings rec nums to update.
+        records = list(records)
+        h_rec_nums = [h.record_metadata.get_iii_recnum(True) for h in records]
         rev_handler = redisobjs.RedisObject('reverse_holdings_list', '0')
-        reverse_holdings_list = rev_handler.get() or {}
-        for h in records:
-            h_rec_num = h.record_metadata.get_iii_recnum(True)
+        reverse_holdings_list = rev_handler.get_fields(h_rec_nums)
+        for h, h_rec_num in zip(records, h_rec_nums):
             old_er_rec_num = reverse_holdings_list.get(h_rec_num, None)
             try:
-                er_rec_num = h.resourcerecord_set.all()[0]\
-                    .record_metadata.get_iii_recnum(True)
+                er = h.resourcerecord_set.all()[0]
             except IndexError:
                 er_rec_num = None
+            else:
+                er_rec_num = er.record_metadata.get_iii_recnum(True)
+                er_objects[er_rec_num] = er
 
             if old_er_rec_num and old_er_rec_num != er_rec_num:
                 # if the current attached er rec_num in Sierra is
@@ -324,22 +351,27 @@ class HoldingUpdate(exporter.Exporter):
                 er_mapping[er_rec_num] = holding_data
 
         h_vals = vals.get('holdings', {})
-        #self.log('Info', er_mapping)
+        id_field = settings.HAYSTACK_ID_FIELD
+        solr_records = self.get_solr_records(er_mapping.keys())
+        to_set, to_add = [], []
         for er_rec_num, holdings in er_mapping.iteritems():
             # if we've already indexed the eresource this holding is
-            # attached to, then we want to pull the record from Solr
-            # and make whatever changes to it rather than reindex the
-            # whole record and all attached holdings from scratch.
+            # attached to, then we want to update the record in Solr
+            # rather than reindex the whole record and all attached
+            # holdings from scratch. We send only the holdings field,
+            # as an atomic update: new titles are just added, and the
+            # whole field is set only if existing titles changed.
             # Since export jobs get broken up and run in parallel, we
             # want to hold off on actually committing to Solr and
             # updating Redis until the callback runs.
-            s = solr.Queryset().filter(record_number=er_rec_num)
-            if s.count() > 0:
+            record = solr_records.get(er_rec_num, None)
+            if record is not None:
                 rec_queue = h_vals.get(er_rec_num, {})
                 rec_append_list = rec_queue.get('append', [])
                 rec_delete_list = rec_queue.get('delete', [])
 
-                record = s[0]
+                rec_holdings = record.get('holdings', [])
+                new_titles, changed = [], False
                 red = redisobjs.RedisObject('eresource_holdings_list',
                                             er_rec_num)
                 red_h_list = red.get()
@@ -349,7 +381,7 @@ class HoldingUpdate(exporter.Exporter):
                     except AttributeError:
                         self.log('Info', '{}'.format(data.get('rec_num')))
                     except ValueError:
-                        record.holdings.append(data.get('title'))
+                        new_titles.append(data.get('title'))
                         rec_append_list.append(data.get('rec_num'))
                     else:
                         if data.get('delete'):
@@ -357,25 +389,39 @@ class HoldingUpdate(exporter.Exporter):
                             # delete anything from Solr, because that
                             # will mess up our holdings index number
                             rec_delete_list.append(data.get('rec_num'))
-                        else:
-                            record.holdings[red_h_index] = data.get('title')
-
-                record.save(commit=False)
+                        elif (rec_holdings[red_h_index] !=
+                              data.get('title')):
+                            rec_holdings[red_h_index] = data.get('title')
+                            changed = True
+
+                if changed:
+                    to_set.append({id_field: record[id_field],
+                                   'holdings': rec_holdings + new_titles})
+                elif new_titles:
+                    to_add.append({id_field: record[id_field],
+                                   'holdings': new_titles})
                 rec_queue['append'] = rec_append_list
                 rec_queue['delete'] = rec_delete_list
                 h_vals[er_rec_num] = rec_queue
-            else:
+            elif er_rec_num in er_objects:
                 # if we haven't indexed the record already, we'll add
                 # it using the Haystack indexer.
-                eresources.add(e)
+                eresources.add(er_objects[er_rec_num])
+
+        try:
+            solr.atomic_update(to_set, op='set', commit=False)
+            solr.atomic_update(to_add, op='add', commit=False)
+        except Exception as e:
+            ex_type, ex, tb = sys.exc_info()
+            logger.info(traceback.extract_tb(tb))
+            self.log('Error', e, log_label)
 
         vals['holdings'] = h_vals
 
         if eresources:
             eresources = list(eresources)
             er_vals = vals.get('eresources', {})
-            er_vals.update(self.eresources_to_solr(self.instance.pk,
-                self.export_filter, self.export_type, self.options)
+            er_vals.update(self.child_exporter(self.eresources_to_solr)
                 .export_records(eresources, er_vals))
             vals['eresources'] = er_vals
 
@@ -391,34 +437,43 @@ class HoldingUpdate(exporter.Exporter):
         h_vals = vals.get('holdings', {})
         er_vals = vals.get('eresources', {})
 
-        self.eresources_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).final_callback(er_vals, status)
+        self.child_exporter(self.eresources_to_solr).final_callback(er_vals,
+                                                                    status)
 
         # commit changes to Redis and commit deletions to Solr
         self.log('Info', 'Committing updates to Redis...')
         rev_handler = redisobjs.RedisObject('reverse_holdings_list', '0')
-        reverse_h_list = rev_handler.get()
+        rev_deletes, rev_updates = set(), {}
+        id_field = settings.HAYSTACK_ID_FIELD
+        solr_records = self.get_solr_records(h_vals.keys())
+        to_set = []
         for er_rec_num, lists in h_vals.iteritems():
-            s = solr.Queryset().filter(record_number=er_rec_num)
-            try:
-                record = s[0]
-            except IndexError:
-                record = None
+            record = solr_records.get(er_rec_num, None)
+            rec_holdings = None if record is None else \
+                           record.get('holdings', [])
 
             er_handler = redisobjs.RedisObject('eresource_holdings_list',
                                                er_rec_num)
-            h_list = er_handler.get()
+            old_h_list = er_handler.get()
+            h_list = list(old_h_list)
             for h_rec_num in lists.get('delete', []):
                 h_index = h_list.index(h_rec_num)
                 del(h_list[h_index])
-                del(reverse_h_list[h_rec_num])
-                del(record.holdings[h_index])
+                rev_deletes.add(h_rec_num)
+                if rec_holdings is not None:
+                    del(rec_holdings[h_index])
             for h_rec_num in lists.get('append', []):
                 h_list.append(h_rec_num)
-                reverse_h_list[h_rec_num] = er_rec_num
-            record.save()
-            er_handler.set(h_list)
-        rev_handler.set(reverse_h_list)
+                rev_updates[h_rec_num] = er_rec_num
+            if rec_holdings is not None and lists.get('delete', []):
+                to_set.append({id_field: record[id_field],
+                               'holdings': rec_holdings})
+            er_handler.update_list(h_list, old_h_list)
+        solr.atomic_update(to_set, op='set', commit=False)
+        # A holding that moved from one eresource to another shows up
+        # as both a delete and an update; the update wins.
+        rev_handler.delete_fields(rev_deletes - set(rev_updates.keys()))
+        rev_handler.set_fields(rev_updates)
         index = self.index_class()
         index.commit(using=self.hs_conn)
     
@@ -432,6 +487,7 @@ class BibsDownloadMarc(exporter.Exporter):
     model_name = 'BibRecord'
     prefetch_related = [
         'record_metadata__varfield_set',
+        'record_metadata__controlfield_set',
         'bibrecorditemrecordlink_set',
         'bibrecorditemrecordlink_set__item_record',
         'bibrecorditemrecordlink_set__item_record__record_metadata',
@@ -465,6 +521,23 @@ class BibsDownloadMarc(exporter.Exporter):
                 vals['success_count'] = batch.success_count
         return vals
 
+    def to_marc_data(self, records):
+        '''
+        Converts records to MARC21 data in memory, for exporters (like
+        BibsToSolr) that hand MARC to another process rather than
+        writing a file. Logs a warning for each record that couldn't
+        be converted. Returns the S2MarcBatch object, which keeps the
+        converted pymarc records in marc_records, and the MARC data.
+        '''
+        log_label = self.__class__.__name__
+        with metrics.timed('prepare'):
+            batch = S2MarcBatch(records)
+            marc_data = batch.to_string(batch.to_marc())
+        for e in batch.errors:
+            self.log('Warning', 'Record {}: {}'.format(e.id, e.msg),
+                     log_label)
+        return batch, marc_data
+
     def final_callback(self, vals={}, status='success'):
         log_label = self.__class__.__name__
         if 'success_count' in vals:
@@ -480,7 +553,10 @@ class BibsToSolr(exporter.Exporter):
     '''
     Defines processes that export Sierra/MARC bibs out to Solr. Note
     that we instantiate a BibsDownloadMarc exporter first because we
-    need to output a MARC file that will be indexed using Solrmarc.
+    need to convert bibs to MARC that will be indexed using Solrmarc.
+    The MARC gets piped straight to a long-running Solrmarc process--
+    no file is written and no JVM is started per chunk--and the
+    converted records are reused for the MARC index.
     '''
     max_rec_chunk = 1000
     bibs_hs_conn = settings.EXPORTER_HAYSTACK_CONNECTIONS['BibsToSolr:BIBS']
@@ -497,6 +573,7 @@ class BibsToSolr(exporter.Exporter):
     ]
     prefetch_related = [
         'record_metadata__varfield_set',
+        'record_metadata__controlfield_set',
         'bibrecorditemrecordlink_set',
         'bibrecorditemrecordlink_set__item_record',
         'bibrecorditemrecordlink_set__item_record__record_metadata',
@@ -505,48 +582,48 @@ class BibsToSolr(exporter.Exporter):
     ]
     select_related = ['record_metadata']
     
+    def run_solrmarc(self, marc_data):
+        '''
+        Indexes marc_data (MARC21) using this process's long-running
+        Solrmarc worker (see export.solrmarc), which is started the
+        first time it's needed and restarted if it fails. Returns
+        Solrmarc's output for this batch. Raises
+        solrmarc.SolrmarcError if the batch couldn't be indexed.
+        '''
+        with metrics.timed('post'):
+            return solrmarc.get_worker().index(marc_data)
+
+    def log_solrmarc_output(self, output):
+        '''
+        Logs the WARN and ERROR lines from Solrmarc's output as
+        warnings and errors.
+        '''
+        log_label = self.__class__.__name__
+        for line in output.decode('unicode-escape').split('\n'):
+            line = re.sub(r'^\s+', '', line)
+            if re.match(r'^WARN', line):
+                self.log('Warning', line, log_label)
+            elif re.match(r'^ERROR', line):
+                self.log('Error', line, log_label)
+
     def export_records(self, records, vals={}):
         log_label = self.__class__.__name__
-        cmd = 'bash'
-        index_script = settings.SOLRMARC_COMMAND
-        config_file = settings.SOLRMARC_CONFIG_FILE
-        filedir = settings.MEDIA_ROOT
-        if filedir[-1] != '/':
-            filedir = '{}/'.format(filedir)
-        bib_converter = self.bib2marc_class(
-            self.instance.pk, self.export_filter, self.export_type,
-            self.options
-        )
-        ret_vals = bib_converter.export_records(records, vals={})
-        filename = ret_vals['marcfile']
-        filepath = '{}{}'.format(filedir, filename)
+        bib_converter = self.child_exporter(self.bib2marc_class)
+        batch, marc_data = bib_converter.to_marc_data(records)
         try:
-            output = subprocess.check_output([cmd, index_script, config_file,
-                                             filepath], 
-                                             stderr=subprocess.STDOUT,
-                                             shell=False,
-                                             universal_newlines=True)
-            output = output.decode('unicode-escape')
-        except subprocess.CalledProcessError as e:
-            error_lines = e.output.split("\n")
-            for line in error_lines:
-                self.log('Error', line)
+            output = self.run_solrmarc(marc_data)
+        except solrmarc.SolrmarcError as e:
+            self.log_solrmarc_output(e.output)
+            self.log('Error', e, log_label)
             self.log('Error', 'Solrmarc process did not run successfully.',
                      log_label)
         else:
-            error_lines = output.split("\n")
-            del(error_lines[-1])
-            if error_lines:
-                for line in error_lines:
-                    line = re.sub(r'^\s+', '', line)
-                    if re.match(r'^WARN', line):
-                        self.log('Warning', line, log_label)
-                    elif re.match(r'^ERROR', line):
-                        self.log('Error', line, log_label)
+            self.log_solrmarc_output(output)
 
             # if all went well, we now try to output JSON-MARC to the
-            # MARC index
-            index = self.marc_index_class(queryset=records)
+            # MARC index, reusing the records we converted above
+            index = self.marc_index_class(queryset=records,
+                        marc_records=batch.marc_records)
             try:
                 index.update(using=self.marc_hs_conn, commit=False)
             except Exception as e:
@@ -554,25 +631,22 @@ class BibsToSolr(exporter.Exporter):
                 logger.info(traceback.extract_tb(tb))
                 self.log('Error', e, log_label)
 
-        # delete the file when we're done so we don't take up space
-        os.remove(filepath)
         return vals
 
     def delete_records(self, records, vals={}):
         log_label = self.__class__.__name__
         bibs_index = self.bibs_index_class()
         marc_index = self.marc_index_class()
-        for i in records:
-            try:
-                bibs_index.remove_object('base.bibrecord.{}'.format(str(i.id)),
-                                    using=self.bibs_hs_conn, commit=False)
-                marc_index.remove_object('base.bibrecord.{}'.format(str(i.id)),
-                                    using=self.marc_hs_conn, commit=False)
-            except Exception as e:
-                ex_type, ex, tb = sys.exc_info()
-                logger.info(traceback.extract_tb(tb))
-                self.log('Error', 'Record {}: {}'
-                         ''.format(str(i), e), log_label)
+        ids = ['base.bibrecord.{}'.format(str(i.id)) for i in records]
+        try:
+            bibs_index.remove_objects(ids, using=self.bibs_hs_conn,
+                                      commit=False)
+            marc_index.remove_objects(ids, using=self.marc_hs_conn,
+                                      commit=False)
+        except Exception as e:
+            ex_type, ex, tb = sys.exc_info()
+            logger.info(traceback.extract_tb(tb))
+            self.log('Error', e, log_label)
         return vals
 
     def final_callback(self, vals={}, status='success'):
@@ -625,22 +699,17 @@ class ItemsBibsToSolr(exporter.Exporter):
         bibs = []
         for r in records:
             bibs.append(r.bibrecorditemrecordlink_set.all()[0].bib_record)
-        self.items_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).export_records(records)
-        self.bibs_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).export_records(bibs)
+        self.child_exporter(self.items_to_solr).export_records(records)
+        self.child_exporter(self.bibs_to_solr).export_records(bibs)
         return vals
 
     def delete_records(self, records, vals={}):
-        self.items_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).delete_records(records)
+        self.child_exporter(self.items_to_solr).delete_records(records)
         return vals
 
     def final_callback(self, vals={}, status='success'):
-        self.items_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).final_callback(vals, status)
-        self.bibs_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).final_callback(vals, status)
+        self.child_exporter(self.items_to_solr).final_callback(vals, status)
+        self.child_exporter(self.bibs_to_solr).final_callback(vals, status)
 
 
 class BibsAndAttachedToSolr(exporter.Exporter):
@@ -695,13 +764,12 @@ class BibsAndAttachedToSolr(exporter.Exporter):
         h_vals = vals.get('holdings', {})
         b_vals = vals.get('bibs', {})
 
-        i_vals.update(self.items_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).export_records(items, i_vals))
-        h_vals.update(self.holdings_to_solr(self.instance.pk,
-            self.export_filter, self.export_type, self.options)
+        i_vals.update(self.child_exporter(self.items_to_solr)
+            .export_records(items, i_vals))
+        h_vals.update(self.child_exporter(self.holdings_to_solr)
             .export_records(holdings, h_vals))
-        b_vals.update(self.bibs_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).export_records(records, b_vals))
+        b_vals.update(self.child_exporter(self.bibs_to_solr)
+            .export_records(records, b_vals))
 
         vals['items'] = i_vals
         vals['holdings'] = h_vals
@@ -710,8 +778,7 @@ class BibsAndAttachedToSolr(exporter.Exporter):
         return vals
 
     def delete_records(self, records, vals={}):
-        self.bibs_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).delete_records(records)
+        self.child_exporter(self.bibs_to_solr).delete_records(records)
         return vals
 
     def final_callback(self, vals={}, status='success'):
@@ -722,9 +789,7 @@ class BibsAndAttachedToSolr(exporter.Exporter):
         h_vals = vals.get('holdings', {})
         b_vals = vals.get('bibs', {})
 
-        self.items_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).final_callback(i_vals, status)
-        self.holdings_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).final_callback(h_vals, status)
-        self.bibs_to_solr(self.instance.pk, self.export_filter,
-            self.export_type, self.options).final_callback(b_vals, status)
+        self.child_exporter(self.items_to_solr).final_callback(i_vals, status)
+        self.child_exporter(self.holdings_to_solr).final_callback(h_vals,
+                                                                  status)
+        self.child_exporter(self.bibs_to_solr).final_callback(b_vals, status)
@@ -14,6 +14,7 @@ from django.conf import settings
 
 from . import exporter
 from . import models
+from utils import solr
 
 # set up logger, for debugging
 logger = logging.getLogger('sierra.custom')
@@ -39,16 +40,14 @@ class AllMetadataToSolr(exporter.Exporter):
         records = []
         for exporter_name in settings.EXPORTER_METADATA_TYPE_REGISTRY:
             export_type = models.ExportType.objects.get(pk=exporter_name)
-            exporter = export_type.get_exporter_class()(self.instance.pk,
-                self.export_filter, self.export_type, self.options)
+            exporter = self.child_exporter(export_type.get_exporter_class())
             records.extend(exporter.get_records())
         return records
     
     def export_records(self, records, vals={}):
         for exporter_name in settings.EXPORTER_METADATA_TYPE_REGISTRY:
             export_type = models.ExportType.objects.get(pk=exporter_name)
-            exporter = export_type.get_exporter_class()(self.instance.pk,
-                self.export_filter, self.export_type, self.options)
+            exporter = self.child_exporter(export_type.get_exporter_class())
             exporter.export_records(records)
         return vals
 
@@ -56,6 +55,7 @@ class AllMetadataToSolr(exporter.Exporter):
         self.log('Info', 'Committing updates to Solr...')
         index = self.index_class()
         index.commit(using=self.hs_conn)
+        solr.clear_lookups()
 
 
 class AllToSolr(exporter.Exporter):
@@ -161,8 +161,7 @@ class AllToSolr(exporter.Exporter):
                              'records: process is not defined.'
                              ''.format(process_type, p_name, rt))
                 else:
-                    process = p_class(self.instance.pk,
-                        self.export_filter, self.export_type, self.options)
+                    process = self.child_exporter(p_class)
                     getattr(process, process_type)(div_records[rt])
     
     def export_records(self, records, vals={}):
@@ -10,6 +10,7 @@ project using the EXPORTER_MODULE_REGISTRY Django setting.
 from __future__ import unicode_literals
 
 import logging
+from contextlib import contextmanager
 
 from django.db.models import F
 from django.utils import timezone as tz
@@ -84,6 +85,21 @@ class Exporter(object):
     5000 could use up all your memory. Keep an eye on it when you're
     testing your export jobs, and adjust those numbers accordingly for
     your subclass.
+
+    Before export_records runs on a chunk, the export task fetches the
+    chunk's records (so it can time the fetch and count the rows for
+    the chunk's ExportChunk metrics). If your export_records doesn't
+    use the records it's passed, set uses_records to False so they
+    don't get fetched for nothing.
+
+    Warnings and errors logged via log() are counted on the
+    ExportInstance. Inside a buffered_log_counts() block the counts
+    are kept in memory and written in one UPDATE when the block exits,
+    and only the first max_log_sample warning and error messages are
+    kept (in log_sample) for the ExportChunk record. Exporters that
+    hand records off to other exporters should create them with
+    child_exporter(), so the child's warnings and errors are counted
+    (and buffered) along with the parent's.
     
     '''
     record_filter = []
@@ -93,7 +109,9 @@ class Exporter(object):
     max_rec_chunk = 3000
     max_del_chunk = 1000
     parallel = True
+    uses_records = True
     model_name = ''
+    max_log_sample = 20
 
     def __init__(self, instance_pk, export_filter, export_type, options={},
                  log_label=''):
@@ -112,6 +130,10 @@ class Exporter(object):
         self.export_type = export_type
         self.options = options
         self.log_label = log_label if log_label else self.__class__.__name__
+        self.buffer_log_counts = False
+        self.log_counts = {'errors': 0, 'warnings': 0}
+        self.log_sample = []
+        self.parent = None
         if export_filter == 'last_export':
             try:
                 latest = ExportInstance.objects.filter(
@@ -185,11 +207,68 @@ class Exporter(object):
         message = '[{}] {}'.format(label, message)
         getattr(self.logger, type.lower())(message)
         if type.lower() == 'warning' or type.lower() == 'error':
-            if type.lower() == 'warning':
-                self.instance.warnings = F('warnings') + 1
-            else:
-                self.instance.errors = F('errors') + 1
-            self.instance.save()
+            self.count_log_message(type, message)
+
+    def count_log_message(self, type, message):
+        '''
+        Counts a warning or error message logged via log(). Child
+        exporters (see child_exporter) pass theirs up to the parent.
+        '''
+        if self.parent is not None:
+            self.parent.count_log_message(type, message)
+            return
+        self.log_counts['{}s'.format(type.lower())] += 1
+        if len(self.log_sample) < self.max_log_sample:
+            self.log_sample.append('{}: {}'.format(type, message))
+        if not self.buffer_log_counts:
+            self.flush_log_counts()
+
+    def flush_log_counts(self):
+        '''
+        Adds the warning and error counts accumulated since the last
+        flush to the ExportInstance in a single atomic UPDATE (so
+        parallel workers don't overwrite each other's counts), then
+        resets them.
+        '''
+        errors = self.log_counts['errors']
+        warnings = self.log_counts['warnings']
+        if errors or warnings:
+            ExportInstance.objects.filter(pk=self.instance.pk).update(
+                errors=F('errors') + errors,
+                warnings=F('warnings') + warnings)
+            self.instance.errors += errors
+            self.instance.warnings += warnings
+            self.log_counts = {'errors': 0, 'warnings': 0}
+
+    def child_exporter(self, exporter_class):
+        '''
+        Returns an instance of exporter_class for this export job, for
+        exporters that pass some of their work to other exporters. The
+        child counts its warnings and errors toward this exporter's, so
+        they end up in this exporter's log_counts and log_sample and
+        are buffered if this exporter is buffering.
+        '''
+        child = exporter_class(self.instance.pk, self.export_filter,
+                               self.export_type, self.options)
+        child.parent = self
+        return child
+
+    @contextmanager
+    def buffered_log_counts(self):
+        '''
+        Buffers warning and error counts in memory for the duration of
+        the with block and flushes them once when it exits, whether or
+        not it exits with an exception. Use it around a chunk of work
+        that might log many warnings, so each one doesn't cost a
+        database write.
+        '''
+        self.buffer_log_counts = True
+        self.log_sample = []
+        try:
+            yield
+        finally:
+            self.buffer_log_counts = False
+            self.flush_log_counts()
 
     def save_status(self):
         '''
@@ -203,7 +282,9 @@ class Exporter(object):
             self.log('Warning', message)
             status = Status.objects.get(pk='unknown')
         self.instance.status = status
-        self.instance.save()
+        # Only save the status so we don't overwrite the counts other
+        # workers have flushed since we loaded the instance.
+        self.instance.save(update_fields=['status'])
 
     def get_records(self):
         '''
@@ -0,0 +1,163 @@
+'''
+Collects performance metrics for export job chunks. The export task
+(export.tasks.do_export_chunk) measures each chunk with a
+ChunkMetrics object and saves the results as an
+export.models.ExportChunk; code that runs during the chunk can use
+timed() to attribute time to a phase (fetch, prepare, post, commit)
+without needing a reference to the ChunkMetrics object.
+'''
+from __future__ import unicode_literals
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+_local = threading.local()
+
+
+def get_active():
+    '''
+    Returns the ChunkMetrics object that's measuring the current
+    thread's chunk, or None.
+    '''
+    return getattr(_local, 'metrics', None)
+
+
+@contextmanager
+def timed(phase):
+    '''
+    Adds the time spent in the with block to the given phase of the
+    chunk being measured in this thread. Does nothing if no chunk is
+    being measured.
+    '''
+    metrics = get_active()
+    if metrics is None:
+        yield
+    else:
+        with metrics.timed(phase):
+            yield
+
+
+def add_rows(count):
+    '''
+    Adds count to the rows processed by the chunk being measured in
+    this thread. The export task counts the records it fetches for a
+    chunk; exporters that don't use those records (see
+    export.exporter.Exporter.uses_records) call this to count what
+    they actually process instead. Does nothing if no chunk is being
+    measured.
+    '''
+    metrics = get_active()
+    if metrics is not None:
+        metrics.rows += count
+
+
+class ChunkMetrics(object):
+    '''
+    Measures one chunk: total time, time per phase, number of SQL
+    queries, rows processed, and the worker's peak RSS. Phases may be
+    nested; time spent in an inner phase counts only toward that
+    phase, so phase times never overlap. Any time not spent in a
+    phase is reported as "other" by ExportChunk. Note that peak RSS
+    comes from ru_maxrss, which is the peak over the worker process's
+    whole life so far, not just this chunk's.
+    '''
+    phases = ('fetch', 'prepare', 'post', 'commit')
+
+    def __init__(self):
+        self.times = dict.fromkeys(self.phases, 0.0)
+        self.total_time = 0.0
+        self.rows = 0
+        self.query_count = 0
+        self.peak_rss = None
+        self._stack = []
+
+    @contextmanager
+    def timed(self, phase):
+        frame = [time.time(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.time() - frame[0]
+            self.times[phase] += elapsed - frame[1]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    @contextmanager
+    def measure(self):
+        '''
+        Measures everything in the with block and makes this the
+        active ChunkMetrics object for the current thread while the
+        block runs. Queries are counted by wrapping the cursors that
+        each database connection hands out during the block (see
+        CountingCursor), rather than by turning on Django's debug
+        cursor, which would keep the SQL for every query in memory.
+        '''
+        conns = connections.all()
+        for conn in conns:
+            conn.cursor = self._counting_cursor(conn.cursor)
+        _local.metrics = self
+        start = time.time()
+        try:
+            yield self
+        finally:
+            self.total_time = time.time() - start
+            _local.metrics = None
+            for conn in conns:
+                del conn.cursor
+            # ru_maxrss is the peak for the whole worker process so
+            # far, in kilobytes (on Linux).
+            self.peak_rss = resource.getrusage(
+                                resource.RUSAGE_SELF).ru_maxrss
+
+    def _counting_cursor(self, cursor_method):
+        def cursor(*args, **kwargs):
+            return CountingCursor(cursor_method(*args, **kwargs), self)
+        return cursor
+
+    def as_model_fields(self):
+        fields = {'{}_time'.format(p): self.times[p] for p in self.phases}
+        fields.update({
+            'total_time': self.total_time,
+            'rows': self.rows,
+            'query_count': self.query_count,
+            'peak_rss': self.peak_rss,
+        })
+        return fields
+
+
+class CountingCursor(object):
+    '''
+    Wraps a database cursor and counts the queries executed through it
+    on a ChunkMetrics object. Everything else is passed through to the
+    wrapped cursor.
+    '''
+    def __init__(self, cursor, metrics):
+        self.cursor = cursor
+        self.metrics = metrics
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        self.cursor.__enter__()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return self.cursor.__exit__(type, value, traceback)
+
+    def execute(self, sql, params=None):
+        self.metrics.query_count += 1
+        return self.cursor.execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.metrics.query_count += 1
+        return self.cursor.executemany(sql, param_list)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('export', '0002_auto_20170620_1001'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportChunk',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('exporter', models.CharField(max_length=255, blank=True)),
+                ('chunk_type', models.CharField(max_length=255)),
+                ('start', models.IntegerField()),
+                ('end', models.IntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('rows', models.IntegerField(default=0)),
+                ('total_time', models.FloatField(default=0)),
+                ('fetch_time', models.FloatField(default=0)),
+                ('prepare_time', models.FloatField(default=0)),
+                ('post_time', models.FloatField(default=0)),
+                ('commit_time', models.FloatField(default=0)),
+                ('query_count', models.IntegerField(default=0)),
+                ('peak_rss', models.IntegerField(null=True, verbose_name='worker peak RSS (KB)', blank=True)),
+                ('errors', models.IntegerField(default=0)),
+                ('warnings', models.IntegerField(default=0)),
+                ('log_sample', models.TextField(blank=True)),
+                ('instance', models.ForeignKey(to='export.ExportInstance')),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+    ]
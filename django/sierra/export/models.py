@@ -5,6 +5,7 @@ some way to track your exports.
 import importlib
 
 from django.db import models
+from django.db.models import Count, Max, Sum
 from django.contrib.auth.models import User
 
 class ExportType(models.Model):
@@ -74,3 +75,76 @@ class ExportInstance(models.Model):
         return u'{} - {} - {}'.format(self.timestamp,
                                       self.export_type,
                                       self.status)
+
+    def get_chunk_summary(self):
+        '''
+        Totals up the metrics recorded for this job's chunks (see
+        ExportChunk). Note that chunks may run in parallel, so the
+        times are summed across workers rather than wall-clock times.
+        The breakdown item has the same totals for each exporter and
+        chunk type (record or deletion), slowest first, so we can see
+        which one is the bottleneck.
+        '''
+        totals = {'rows': Sum('rows'), 'total_time': Sum('total_time'),
+                  'fetch_time': Sum('fetch_time'),
+                  'prepare_time': Sum('prepare_time'),
+                  'post_time': Sum('post_time'),
+                  'commit_time': Sum('commit_time'),
+                  'query_count': Sum('query_count')}
+        summary = self.exportchunk_set.aggregate(chunks=Count('id'),
+            peak_rss=Max('peak_rss'), **totals)
+        total_time = summary['total_time'] or 0
+        summary['records_per_second'] = None
+        if total_time and summary['rows']:
+            summary['records_per_second'] = (summary['rows'] or 0) / total_time
+        summary['breakdown'] = list(self.exportchunk_set.values('exporter',
+            'chunk_type').annotate(chunks=Count('id'), **totals).order_by(
+            '-total_time'))
+        return summary
+
+
+class ExportChunk(models.Model):
+    '''
+    Performance metrics for one chunk of an export job: timings for
+    each phase (fetching records from the database, preparing them,
+    posting them to Solr, committing), SQL query count, rows
+    processed, and the worker's peak memory use (RSS, in KB) as of the
+    end of the chunk--which is the peak over the worker process's
+    whole life so far, not the chunk's own memory use. Also
+    records how many warnings and errors the chunk logged, with a
+    sample of the messages. Exporter is the name of the Exporter class
+    that ran the chunk.
+    '''
+    instance = models.ForeignKey(ExportInstance)
+    exporter = models.CharField(max_length=255, blank=True)
+    chunk_type = models.CharField(max_length=255)
+    start = models.IntegerField()
+    end = models.IntegerField()
+    timestamp = models.DateTimeField()
+    rows = models.IntegerField(default=0)
+    total_time = models.FloatField(default=0)
+    fetch_time = models.FloatField(default=0)
+    prepare_time = models.FloatField(default=0)
+    post_time = models.FloatField(default=0)
+    commit_time = models.FloatField(default=0)
+    query_count = models.IntegerField(default=0)
+    peak_rss = models.IntegerField('worker peak RSS (KB)', null=True,
+                                   blank=True)
+    errors = models.IntegerField(default=0)
+    warnings = models.IntegerField(default=0)
+    log_sample = models.TextField(blank=True)
+
+    def __unicode__(self):
+        return u'{} - {}s {} - {}'.format(self.instance, self.chunk_type,
+                                          self.start + 1, self.end)
+
+    @property
+    def other_time(self):
+        return max(self.total_time - self.fetch_time - self.prepare_time
+                   - self.post_time - self.commit_time, 0)
+
+    @property
+    def records_per_second(self):
+        if not self.total_time or not self.rows:
+            return None
+        return self.rows / self.total_time
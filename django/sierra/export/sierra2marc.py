@@ -3,6 +3,8 @@ sierra2marc.py defines a class (S2MarcBatch) for parsing the Sierra
 models out into MARC21 using Pymarc.
 '''
 import re
+import os
+import io
 import codecs
 import sys
 import pymarc
@@ -10,6 +12,7 @@ from time import time as timestamp
 
 from django.conf import settings
 
+from base import models as sierra_models
 from utils import helpers
 
 
@@ -34,6 +37,7 @@ class S2MarcBatch(object):
         'sudoc': 'e',
         'other': 'f'
     } 
+    control_tags = ['{:03}'.format(num) for num in range(1, 10)]
 
     def __init__(self, records):
         if (hasattr(records, '__iter__')):
@@ -43,6 +47,42 @@ class S2MarcBatch(object):
 
         self.errors = []
         self.success_count = 0
+        # Maps each converted record's pk to its pymarc record (or to
+        # None if it couldn't be converted), so that other consumers of
+        # the same batch don't have to convert records again.
+        self.marc_records = {}
+        self._varfields = {}
+        self._control_fields = {}
+
+    def _fetch_fields(self, records):
+        '''
+        Gets the varfields and control fields for a batch of records
+        so that _one_to_marc doesn't have to query for them one record
+        at a time. If the records were fetched using prefetch_related
+        for record_metadata__varfield_set and/or
+        record_metadata__controlfield_set, those prefetched sets are
+        used. Any that weren't prefetched are fetched for the whole
+        batch at once: one query for varfields and one for control
+        fields. Results are stored in self._varfields and
+        self._control_fields, keyed by record_metadata id.
+        '''
+        for model, cache in ((sierra_models.Varfield, self._varfields),
+                             (sierra_models.ControlField,
+                              self._control_fields)):
+            cache_name = model._meta.get_field('record').related_query_name()
+            to_fetch = []
+            for r in records:
+                rm = r.record_metadata
+                prefetched = getattr(rm, '_prefetched_objects_cache', {})
+                if cache_name in prefetched:
+                    cache[rm.pk] = list(prefetched[cache_name])
+                else:
+                    to_fetch.append(rm.pk)
+            if to_fetch:
+                for rm_pk in to_fetch:
+                    cache[rm_pk] = []
+                for field in model.objects.filter(record_id__in=to_fetch):
+                    cache[field.record_id].append(field)
 
     def _one_to_marc(self, r):
         '''
@@ -53,12 +93,14 @@ class S2MarcBatch(object):
         Solr.
         '''
         marc_record = pymarc.record.Record(force_utf8=True)
-        try:
-            control_fields = r.record_metadata.controlfield_set.all()
-        except Exception as e:
-            raise S2MarcError('Skipped. Couldn\'t retrieve control fields. '
-                    '({})'.format(e), str(r))
-        for cf in control_fields:
+        rm_pk = r.record_metadata.pk
+        if rm_pk not in self._control_fields or rm_pk not in self._varfields:
+            try:
+                self._fetch_fields([r])
+            except Exception as e:
+                raise S2MarcError('Skipped. Couldn\'t retrieve varfields or '
+                        'control fields. ({})'.format(e), str(r))
+        for cf in self._control_fields[rm_pk]:
             try:
                 data = cf.get_data()
                 field = pymarc.field.Field(tag=cf.get_tag(), data=data)
@@ -66,21 +108,16 @@ class S2MarcBatch(object):
             except Exception as e:
                 raise S2MarcError('Skipped. Couldn\'t create MARC field '
                     'for {}. ({})'.format(cf.get_tag(), e), str(r))
-        try:
-            varfields = r.record_metadata.varfield_set\
-                        .exclude(marc_tag=None)\
-                        .exclude(marc_tag='')\
-                        .order_by('marc_tag')
-        except Exception as e:
-            raise S2MarcError('Skipped. Couldn\'t retrieve varfields. '
-                    '({})'.format(e), str(r))
+        varfields = sorted([vf for vf in self._varfields[rm_pk]
+                            if vf.marc_tag],
+                           key=lambda vf: (vf.marc_tag, vf.occ_num))
         for vf in varfields:
             tag = vf.marc_tag
             ind1 = vf.marc_ind1
             ind2 = vf.marc_ind2
             content = vf.field_content
             try:
-                if tag in ['{:03}'.format(num) for num in range(1,10)]:
+                if tag in self.control_tags:
                     field = pymarc.field.Field(tag=tag, data=content)
                 else:
                     field = pymarc.field.Field(
@@ -152,14 +189,25 @@ class S2MarcBatch(object):
     def to_marc(self):
         '''
         Converts all self.records to pymarc record objects and
-        returns an array of them. Stores errors in self.errors.
+        returns an array of them. Stores errors in self.errors and
+        the converted records, by pk, in self.marc_records.
         '''
         marc_records = []
+        try:
+            self._fetch_fields(self.records)
+        except Exception:
+            # If the batch fetch fails, _one_to_marc will try again for
+            # each record and report errors per record.
+            pass
         for r in self.records:
             try:
-                marc_records.append(self._one_to_marc(r))
+                record = self._one_to_marc(r)
             except S2MarcError as e:
                 self.errors.append(e)
+                self.marc_records[r.pk] = None
+            else:
+                marc_records.append(record)
+                self.marc_records[r.pk] = record
         self.success_count = len(marc_records)
         return marc_records
 
@@ -179,44 +227,36 @@ class S2MarcBatch(object):
                 success_count += 1
         return success_count
 
+    def to_string(self, marc_records):
+        '''
+        Like to_file, but returns the MARC21 data instead of writing
+        it to disk.
+        '''
+        marcdata = io.BytesIO()
+        self.success_count = self._write_records(marc_records, marcdata)
+        return marcdata.getvalue()
+
     def to_file(self, marc_records, filename='{}.mrc'.format(timestamp()),
                 filepath='{}'.format(settings.MEDIA_ROOT), append=True):
         '''
-        Writes MARC21 file to disk.
+        Writes MARC21 file to disk. If append is True, the records are
+        streamed onto the end of the file (if it exists) without
+        reading back anything that's already there, so writing a file
+        in chunks costs the same per chunk no matter how big the file
+        gets. If append is False and the file already exists, a new
+        filename is generated instead.
         '''
         self.success_count = 0
-        # If the file exists and append is True, we want to open the
-        # file up, read in the MARC records, then append our
-        # marc_records to that.
-        existing_records = []
         if filepath[-1] != '/':
             filepath = '{}/'.format(filepath)
-        try:
-            marcfile = file('{}{}'.format(filepath, filename), 'r')
-        except IOError:
-            pass
-        else:
-            if append:
-                reader = pymarc.MARCReader(marcfile)
-                existing_records.extend(reader)
-            else:
-                # If we're not appending but we found an existing file,
-                # let's find a new filename that doesn't exist.
-                file_exists = True
-                while file_exists:
-                    filename = '{}.mrc'.format(timestamp())
-                    try:
-                        file('{}{}'.format(filepath, filename), 'r')
-                    except IOError:
-                        file_exists = False
+        if not append:
+            while os.path.exists('{}{}'.format(filepath, filename)):
+                filename = '{}.mrc'.format(timestamp())
 
+        marcfile = open('{}{}'.format(filepath, filename),
+                        'ab' if append else 'wb')
         try:
-            marcfile = file('{}{}'.format(filepath, filename), 'w')
-        except IOError:
-            raise
-        if existing_records:
-            self._write_records(existing_records, marcfile)
-        self.success_count = self._write_records(marc_records, marcfile)
-        marcfile.close()
+            self.success_count = self._write_records(marc_records, marcfile)
+        finally:
+            marcfile.close()
         return filename
-        
\ No newline at end of file
@@ -0,0 +1,198 @@
+'''
+Runs Solrmarc as a long-lived process, so that indexing each chunk of
+bibs doesn't mean starting a new JVM and loading Solrmarc's
+configuration all over again. Use get_worker() to get the worker for
+the current process (e.g. the current Celery worker process) and
+call its index method with the MARC21 data for each batch.
+'''
+from __future__ import unicode_literals
+import atexit
+import logging
+import os
+import re
+import select
+import subprocess
+import threading
+import time
+
+from django.conf import settings
+
+
+# set up logger, for debugging
+logger = logging.getLogger('sierra.custom')
+
+
+class SolrmarcError(Exception):
+    '''
+    Raised when Solrmarc couldn't index a batch of records. The output
+    attribute contains whatever Solrmarc printed for the batch.
+    '''
+    def __init__(self, message, output=b''):
+        super(SolrmarcError, self).__init__(message)
+        self.output = output
+
+
+class SolrmarcWorker(object):
+    '''
+    One Solrmarc process that stays running and indexes each batch of
+    MARC records written to its stdin. Solrmarc reads records from the
+    stream until it's closed, sending each one to Solr as it goes, and
+    (when run via indexstream.sh) logs one line for each record it
+    finishes: "Added record ...", "Unable to index record ...", and so
+    on. Counting those lines tells us when Solrmarc is done with a
+    batch, which is the batch's acknowledgement. Solrmarc doesn't
+    commit (see solr.commit_at_end in indexstream.sh); the exporter
+    does that when the job is done.
+
+    The process is started when the first batch is sent. If it has
+    died, or it doesn't acknowledge a batch within timeout seconds, it
+    is killed and a new one is started, and the batch is sent again
+    (re-adding the same docs to Solr does no harm), up to retries
+    times before SolrmarcError is raised.
+    '''
+    record_done = re.compile(br'(Added|Deleted|Ignored) record '
+                             br'|Unable to (index|read) record ')
+    record_terminator = b'\x1d'
+    timeout = 600
+    retries = 1
+    stop_timeout = 10
+
+    def __init__(self, command, config_file):
+        self.cmd = ['bash', command, config_file]
+        self.proc = None
+        self._buffer = b''
+        self._lock = threading.Lock()
+
+    def is_alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def start(self):
+        self.stop(kill=True)
+        logger.info('Starting Solrmarc worker: {}'.format(' '.join(self.cmd)))
+        self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT,
+                                     close_fds=True)
+        self._buffer = b''
+
+    def stop(self, kill=False):
+        '''
+        Stops the Solrmarc process, if there is one. Normally this
+        closes Solrmarc's stdin and gives it stop_timeout seconds to
+        finish up and exit before killing it; with kill=True it's
+        killed right away.
+        '''
+        proc, self.proc = self.proc, None
+        if proc is None or proc.poll() is not None:
+            return
+        if not kill:
+            try:
+                proc.stdin.close()
+            except (IOError, OSError):
+                pass
+            deadline = time.time() + self.stop_timeout
+            while proc.poll() is None and time.time() < deadline:
+                time.sleep(0.1)
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+    def index(self, marc_data):
+        '''
+        Sends marc_data (MARC21) to Solrmarc and waits until Solrmarc
+        has finished every record in it, restarting Solrmarc if needed
+        (see the class docstring). Returns Solrmarc's output for the
+        batch--warnings, errors, and so on--one line per line.
+        '''
+        count = marc_data.count(self.record_terminator)
+        if not count:
+            return b''
+        with self._lock:
+            error = None
+            for attempt in range(0, self.retries + 1):
+                if not self.is_alive():
+                    self.start()
+                try:
+                    return self._send(marc_data, count)
+                except SolrmarcError as e:
+                    logger.warning('Solrmarc worker failed on attempt {} '
+                                   'of {}: {}'.format(attempt + 1,
+                                                      self.retries + 1, e))
+                    self.stop(kill=True)
+                    error = e
+            raise error
+
+    def _send(self, marc_data, count):
+        '''
+        Writes marc_data to Solrmarc's stdin while reading its output,
+        so neither side can block the other on a full pipe, until we've
+        seen count finished records or time runs out.
+        '''
+        fd_in, fd_out = self.proc.stdin.fileno(), self.proc.stdout.fileno()
+        lines, done, sent = [], 0, 0
+        deadline = time.time() + self.timeout
+        while done < count:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise SolrmarcError('Solrmarc did not finish the batch '
+                                    'within {} seconds.'.format(self.timeout),
+                                    b''.join(lines))
+            writing = [fd_in] if sent < len(marc_data) else []
+            readable, writable, _ = select.select([fd_out], writing, [],
+                                                  remaining)
+            if writable:
+                try:
+                    sent += os.write(fd_in,
+                                     marc_data[sent:sent + select.PIPE_BUF])
+                except OSError as e:
+                    raise SolrmarcError('Could not send records to Solrmarc: '
+                                        '{}'.format(e), b''.join(lines))
+            if readable:
+                data = os.read(fd_out, 65536)
+                if not data:
+                    raise SolrmarcError('Solrmarc exited unexpectedly.',
+                                        b''.join(lines) + self._buffer)
+                self._buffer += data
+                new_lines = self._buffer.split(b'\n')
+                self._buffer = new_lines.pop()
+                for line in new_lines:
+                    lines.append(line + b'\n')
+                    if self.record_done.search(line):
+                        done += 1
+        return b''.join(lines)
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_worker(command=None, config_file=None):
+    '''
+    Returns the SolrmarcWorker for the current process that runs the
+    given command (default settings.SOLRMARC_STREAM_COMMAND) with the
+    given config file (default settings.SOLRMARC_CONFIG_FILE). Workers
+    are kept per process ID, so a forked process (like a Celery pool
+    worker) never shares its parent's Solrmarc process.
+    '''
+    command = command or settings.SOLRMARC_STREAM_COMMAND
+    config_file = config_file or settings.SOLRMARC_CONFIG_FILE
+    key = (os.getpid(), command, config_file)
+    with _workers_lock:
+        worker = _workers.get(key, None)
+        if worker is None:
+            worker = SolrmarcWorker(command, config_file)
+            _workers[key] = worker
+    return worker
+
+
+@atexit.register
+def stop_workers():
+    '''
+    Stops this process's Solrmarc workers. If a process exits without
+    calling this, its Solrmarc processes still see their stdin close
+    and exit on their own.
+    '''
+    pid = os.getpid()
+    for key, worker in _workers.items():
+        if key[0] == pid:
+            worker.stop()
@@ -15,6 +15,7 @@ from django.db import connections
 from celery import Task, shared_task, group, chain
 
 from . import exporter
+from . import metrics
 from . import models as export_models
 from .operror import OperationalError
 
@@ -85,6 +86,50 @@ def trigger_export(instance, export_filter, export_type, options):
     )
     
 
+def plan_chunks(records, max):
+    '''
+    Breaks a set of records up into chunks of size max. Returns a
+    tuple: (count, chunks), where count is the total number of records
+    and chunks is a list of (start, end, pk_from, pk_to) tuples. Start
+    and end are positions in the set (end exclusive). For querysets,
+    pk_from and pk_to give the (inclusive) range of PKs that the chunk
+    covers, which do_export_chunk uses to fetch the chunk with a range
+    filter; they're None for lists and other non-queryset sets, which
+    are chunked by slicing.
+
+    PKs are scanned just once, in order, without loading model
+    instances or running any prefetches.
+    '''
+    if records is None:
+        return 0, []
+
+    chunks = []
+    try:
+        pks = records.prefetch_related(None).order_by('pk')\
+                .values_list('pk', flat=True).iterator()
+    except AttributeError:
+        count = len(records)
+        for start in range(0, count, max):
+            chunks.append((start, min(start + max, count), None, None))
+        return count, chunks
+
+    count, start_pk, last_pk = 0, None, None
+    for pk in pks:
+        # Joins in a record filter can return the same row more than
+        # once; we only want to count each PK once.
+        if pk == last_pk:
+            continue
+        if count % max == 0:
+            if start_pk is not None:
+                chunks.append((count - max, count, start_pk, last_pk))
+            start_pk = pk
+        count += 1
+        last_pk = pk
+    if count:
+        chunks.append(((count - 1) // max * max, count, start_pk, last_pk))
+    return count, chunks
+
+
 @shared_task(base=DispatchErrorTask)
 def export_dispatch(instance_pk, export_filter, export_type, options):
     '''
@@ -139,38 +184,28 @@ def export_dispatch(instance_pk, export_filter, export_type, options):
         exp.status = 'errors'
         exp.save_status()
     else:
-        # Get records and deletions counts. If it's a queryset we want
-        # to use count(), otherwise we have to use len(). Lists have a
-        # count() method, but it's not the same as queryset.count().
-        # Lists throw a TypeError if you call count() without an arg.
-        try:
-            records_count = records.count()
-        except (TypeError, AttributeError):
-            records_count = len(records)
-        try:
-            deletions_count = deletions.count()
-        except (TypeError, AttributeError):
-            try:
-                deletions_count = len(deletions)
-            except Exception:
-                deletions_count = 0
-
-        count = {'record': records_count, 'deletion': deletions_count}
+        # Plan chunks for records and deletions. For querysets this
+        # does one ordered scan of PKs up front, so each chunk can be
+        # fetched later using a simple PK range filter instead of an
+        # OFFSET that gets more expensive the further along it is.
+        count, chunks = {}, {}
+        count['record'], chunks['record'] = plan_chunks(records,
+                                                        exp.max_rec_chunk)
+        count['deletion'], chunks['deletion'] = plan_chunks(deletions,
+                                                            exp.max_del_chunk)
         exp.log('Info', '{} records found.'.format(count['record']))
         if deletions is not None:
             exp.log('Info', '{} candidates found for deletion.'
                     ''.format(count['deletion']))
 
         do_it_tasks = []
-        for type in count:
-            max = exp.max_rec_chunk if type == 'record' else exp.max_del_chunk
-            task_args = []
+        for type in chunks:
             batches = 0
-            for start in range(0, count[type], max):
-                end = min(start + max, count[type])
+            for start, end, pk_from, pk_to in chunks[type]:
                 i_args = [{}] + args if start == 0 or exp.parallel else args
                 do_it_tasks.append(
-                    do_export_chunk.s(*i_args, start=start, end=end, type=type)
+                    do_export_chunk.s(*i_args, start=start, end=end, type=type,
+                                      pk_from=pk_from, pk_to=pk_to)
                 )
                 batches += 1
             if batches > 0:
@@ -194,12 +229,16 @@ def export_dispatch(instance_pk, export_filter, export_type, options):
 
 @shared_task(base=ErrorTask)
 def do_export_chunk(vals, instance_pk, export_filter, export_type, options,
-                    start, end, type):
+                    start, end, type, pk_from=None, pk_to=None):
     '''
     Processes a "chunk" of Exporter records, depending on type
     ("record" if it's a record load or "deletion" if it's a deletion).
     Variable vals should be a dictionary of arbitrary values used to
     pass information from task to task.
+
+    Chunks of querysets are selected using the pk_from and pk_to
+    range planned by export_dispatch (see plan_chunks). Start and end
+    are used to slice the records only if no PK range was provided.
     '''
     connections['default'].close()
     try:
@@ -213,42 +252,70 @@ def do_export_chunk(vals, instance_pk, export_filter, export_type, options,
     except OperationalError:
         exp = exporter_class(instance_pk, export_filter, export_type, options,
                              log_label=settings.TASK_LOG_LABEL)
-    records = exp.get_records() if type == 'record' else exp.get_deletions()
-    
-    # This is sort of a hack. My strategy initially was to use queryset
-    # slicing to get chunks we need, but apparently this doesn't work
-    # with prefetch_related--that is, it prefetches data for the ENTIRE
-    # friggin queryset despite the slice and makes us run out of memory
-    # on large jobs. Instead of slicing we actually have to use a
-    # filter before it correctly limits the prefetch. So we slice up
-    # PKs instead and use that as a basis for a filter.
-    try:
-        pks = list(records.prefetch_related(None).order_by('pk')[start:end+1])
-        pk_a = pks[0].pk
-        pk_n = pks[-1].pk
+    # Warning and error counts are flushed to the ExportInstance once,
+    # when the chunk is done, instead of once per logged message.
+    with exp.buffered_log_counts():
         if type == 'record':
-            records = exp.get_records() 
+            records = exp.get_records()
         else:
             records = exp.get_deletions()
-        records = records.order_by('pk').filter(pk__gte=pk_a, pk__lte=pk_n)
-    except AttributeError:
+
+        # Note that we can't just slice the queryset here: prefetch_related
+        # would prefetch data for the ENTIRE queryset despite the slice and
+        # make us run out of memory on large jobs. A PK range filter
+        # correctly limits the prefetch, and it doesn't have to scan past
+        # all the records in previous chunks the way an OFFSET does.
         if records is not None:
-            records = records[start:end+1]
-    
-    job_id = '{}s {} - {}'.format(type, start+1, end)
-    exp.log('Info', 'Starting processing {}.'.format(job_id))
+            if pk_from is not None and pk_to is not None:
+                records = records.order_by('pk').filter(pk__gte=pk_from,
+                                                        pk__lte=pk_to)
+            else:
+                records = records[start:end]
+
+        job_id = '{}s {} - {}'.format(type, start+1, end)
+        exp.log('Info', 'Starting processing {}.'.format(job_id))
+        chunk_metrics = metrics.ChunkMetrics()
+        timestamp = tz.now()
+        with chunk_metrics.measure():
+            try:
+                if records is not None and exp.uses_records:
+                    # Evaluating the queryset up front (exporters reuse its
+                    # cached results) lets us time the DB fetch by itself.
+                    with chunk_metrics.timed('fetch'):
+                        chunk_metrics.rows = len(records)
+                if type == 'record' and records is not None:
+                    vals = exp.export_records(records, vals=vals)
+                elif records is not None:
+                    vals = exp.delete_records(records, vals=vals)
+            except Exception as err:
+                ex_type, ex, tb = sys.exc_info()
+                logger.info(traceback.extract_tb(tb))
+                exp.log('Error', 'Error processing {}: {}.'.format(job_id,
+                                                                   err))
+            else:
+                exp.log('Info', 'Finished processing {}.'.format(job_id))
+        save_chunk_metrics(chunk_metrics, exp, type, start, end, timestamp)
+    return vals
+
+
+def save_chunk_metrics(chunk_metrics, exp, type, start, end, timestamp):
+    '''
+    Saves a ChunkMetrics object as an ExportChunk, along with the
+    warning and error counts and sample of messages that Exporter exp
+    has buffered for the chunk. Failing to save metrics shouldn't fail
+    the chunk, so errors are only logged.
+    '''
     try:
-        if type == 'record' and records is not None:
-            vals = exp.export_records(records, vals=vals)
-        elif records is not None:
-            vals = exp.delete_records(records, vals=vals)
-    except Exception as err:
+        export_models.ExportChunk.objects.create(instance_id=exp.instance.pk,
+            exporter=exp.__class__.__name__, chunk_type=type, start=start,
+            end=end, timestamp=timestamp,
+            errors=exp.log_counts['errors'],
+            warnings=exp.log_counts['warnings'],
+            log_sample='\n'.join(exp.log_sample),
+            **chunk_metrics.as_model_fields())
+    except Exception:
         ex_type, ex, tb = sys.exc_info()
         logger.info(traceback.extract_tb(tb))
-        exp.log('Error', 'Error processing {}: {}.'.format(job_id, err))
-    else:
-        exp.log('Info', 'Finished processing {}.'.format(job_id))
-    return vals
 
 
 @shared_task(base=ErrorTask)
@@ -4,6 +4,8 @@ Tests classes derived from `export.exporter.Exporter`.
 
 import pytest
 
+from export import models as em
+
 
 # FIXTURES AND TEST DATA
 # Fixtures used in the below tests can be found in
@@ -93,3 +95,48 @@ def test_exports_to_solr(etype_code, solr_exporter_test_params, new_exporter,
         assert len(load_results[core]) > 0
         if try_delete:
             assert len(del_results[core]) == 0
+
+
+def test_exporter_buffered_log_counts(new_exporter):
+    """
+    Within a buffered_log_counts block, warnings and errors should be
+    counted in memory and written to the ExportInstance only when the
+    block exits, and only max_log_sample messages should be kept.
+    """
+    exp = new_exporter('ItemsToSolr', 'full_export', 'waiting')
+    exp.max_log_sample = 2
+    with exp.buffered_log_counts():
+        for i in range(0, 3):
+            exp.log('Warning', 'Warning {}'.format(i))
+        exp.log('Error', 'Error')
+        saved = em.ExportInstance.objects.get(pk=exp.instance.pk)
+        assert (saved.warnings, saved.errors) == (0, 0)
+    saved = em.ExportInstance.objects.get(pk=exp.instance.pk)
+    assert (saved.warnings, saved.errors) == (3, 1)
+    assert (exp.instance.warnings, exp.instance.errors) == (3, 1)
+    assert len(exp.log_sample) == 2
+
+
+def test_composite_exporter_buffers_child_log_counts(new_exporter,
+                                                     monkeypatch):
+    """
+    Warnings and errors logged by the exporters that a composite
+    exporter hands records off to should be buffered and counted
+    along with the composite exporter's own.
+    """
+    def export_records(self, records, vals={}):
+        self.log('Warning', 'Child warning')
+        return {}
+
+    exp = new_exporter('BibsAndAttachedToSolr', 'full_export', 'waiting')
+    for child_class in (exp.items_to_solr, exp.holdings_to_solr,
+                        exp.bibs_to_solr):
+        monkeypatch.setattr(child_class, 'export_records', export_records)
+    with exp.buffered_log_counts():
+        exp.export_records([], {})
+        saved = em.ExportInstance.objects.get(pk=exp.instance.pk)
+        assert (saved.warnings, saved.errors) == (0, 0)
+        assert exp.log_counts['warnings'] == 3
+        assert len(exp.log_sample) == 3
+    saved = em.ExportInstance.objects.get(pk=exp.instance.pk)
+    assert (saved.warnings, saved.errors) == (3, 0)
@@ -0,0 +1,141 @@
+"""
+Tests classes and functions in `export.metrics`.
+"""
+
+import pytest
+
+from django.db import connection
+from django.utils import timezone
+
+from export import metrics
+from export import models as em
+
+
+# FIXTURES AND TEST DATA
+
+class FakeClock(object):
+    """
+    Stands in for the time module: each call to time() advances the
+    clock by whatever is set via tick.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def tick(self, secs):
+        self.now += secs
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(metrics, 'time', fake)
+    return fake
+
+
+# TESTS
+
+def test_chunkmetrics_nested_phases_do_not_overlap(clock):
+    """
+    Time spent in a nested phase should count only toward that phase
+    and not toward the phase it's nested in.
+    """
+    m = metrics.ChunkMetrics()
+    with m.timed('post'):
+        clock.tick(1)
+        with m.timed('prepare'):
+            clock.tick(3)
+        clock.tick(1)
+    assert m.times['post'] == 2
+    assert m.times['prepare'] == 3
+
+
+def test_timed_records_to_active_chunkmetrics_only(clock):
+    """
+    The module-level timed function should record time against the
+    ChunkMetrics object being measured in this thread, and should do
+    nothing when no chunk is being measured.
+    """
+    m = metrics.ChunkMetrics()
+    with metrics.timed('fetch'):
+        clock.tick(5)
+    with m.measure():
+        assert metrics.get_active() is m
+        with metrics.timed('fetch'):
+            clock.tick(2)
+        clock.tick(1)
+    assert metrics.get_active() is None
+    assert m.times['fetch'] == 2
+    assert m.total_time == 3
+
+
+def test_chunkmetrics_as_model_fields():
+    """
+    as_model_fields should return kwargs suitable for creating an
+    ExportChunk.
+    """
+    m = metrics.ChunkMetrics()
+    m.rows = 10
+    fields = m.as_model_fields()
+    assert fields['rows'] == 10
+    assert set(fields.keys()) == set(['fetch_time', 'prepare_time',
+                                      'post_time', 'commit_time',
+                                      'total_time', 'rows', 'query_count',
+                                      'peak_rss'])
+
+
+@pytest.mark.django_db
+def test_measure_counts_queries_without_debug_cursor():
+    """
+    ChunkMetrics.measure should count the queries run in the with
+    block without making Django record them, and should put the
+    connection's cursor method back afterward.
+    """
+    m = metrics.ChunkMetrics()
+    queries_before = len(connection.queries)
+    with m.measure():
+        em.ExportType.objects.count()
+        list(em.Status.objects.all())
+    assert m.query_count == 2
+    assert len(connection.queries) == queries_before
+    assert 'cursor' not in connection.__dict__
+
+
+@pytest.mark.django_db
+def test_get_chunk_summary_breaks_down_by_exporter_and_chunk_type(
+        new_export_instance):
+    """
+    ExportInstance.get_chunk_summary should include per-phase totals
+    for each exporter and chunk type, slowest first.
+    """
+    instance = new_export_instance('BibsToSolr', 'full_export', 'waiting')
+    for exporter, chunk_type, post_time in [('BibsToSolr', 'record', 5),
+                                            ('BibsToSolr', 'record', 3),
+                                            ('BibsToSolr', 'deletion', 1),
+                                            ('ItemsToSolr', 'record', 2)]:
+        em.ExportChunk.objects.create(
+            instance=instance, exporter=exporter, chunk_type=chunk_type,
+            start=0, end=10, timestamp=timezone.now(), rows=10,
+            fetch_time=1, post_time=post_time, total_time=post_time + 1)
+    breakdown = instance.get_chunk_summary()['breakdown']
+    assert [(b['exporter'], b['chunk_type'], b['chunks'], b['post_time'])
+            for b in breakdown] == [('BibsToSolr', 'record', 2, 8),
+                                    ('ItemsToSolr', 'record', 1, 2),
+                                    ('BibsToSolr', 'deletion', 1, 1)]
+
+
+def test_add_rows_counts_toward_active_chunkmetrics_only():
+    """
+    The module-level add_rows function should add to the rows of the
+    ChunkMetrics object being measured in this thread, and should do
+    nothing when no chunk is being measured.
+    """
+    metrics.add_rows(5)
+    m = metrics.ChunkMetrics()
+    with m.measure():
+        metrics.add_rows(3)
+        metrics.add_rows(4)
+    metrics.add_rows(5)
+    assert m.rows == 7
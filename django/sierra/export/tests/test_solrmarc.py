@@ -0,0 +1,104 @@
+"""
+Tests classes and functions in `export.solrmarc`.
+"""
+
+import sys
+
+import pytest
+
+from export import solrmarc
+
+
+# FIXTURES AND TEST DATA
+
+FAKE_SOLRMARC = r"""
+import os, sys
+flag = sys.argv[1]
+count, buf = 0, b''
+while True:
+    data = os.read(0, 4096)
+    if not data:
+        break
+    buf += data
+    while b'\x1d' in buf:
+        rec, buf = buf.split(b'\x1d', 1)
+        count += 1
+        if b'CRASH' in rec and not os.path.exists(flag):
+            open(flag, 'w').close()
+            sys.exit(1)
+        if b'SILENT' in rec:
+            continue
+        if b'WARN' in rec:
+            sys.stdout.write(' WARN [main] (Fake.java:1) - Problem with '
+                             'record {}\n'.format(count))
+        sys.stdout.write(' INFO [main] (MarcImporter.java:1) - Added record '
+                         '{} read from file: {}\n'.format(count, rec))
+        sys.stdout.flush()
+"""
+
+
+@pytest.fixture
+def worker(tmpdir):
+    """
+    Returns a SolrmarcWorker that runs a fake Solrmarc script, which
+    acknowledges each record it reads the way Solrmarc does. Records
+    containing WARN get a warning; records containing SILENT are never
+    acknowledged; the first record containing CRASH kills the process.
+    """
+    script = tmpdir.join('fake_solrmarc.py')
+    script.write(FAKE_SOLRMARC)
+    command = tmpdir.join('fake_solrmarc.sh')
+    command.write('exec {} {} "$@"\n'.format(sys.executable, script))
+    w = solrmarc.SolrmarcWorker(str(command), str(tmpdir.join('crashed')))
+    yield w
+    w.stop(kill=True)
+
+
+def make_marc(*records):
+    return b''.join([r + b'\x1d' for r in records])
+
+
+# TESTS
+
+def test_solrmarcworker_reuses_one_process(worker):
+    """
+    A SolrmarcWorker should start Solrmarc on the first batch and then
+    reuse that process for later batches, returning the output for
+    each batch once every record in it has been acknowledged. Batches
+    with a lot of output shouldn't deadlock on the pipes.
+    """
+    output = worker.index(make_marc(b'rec1', b'rec2 WARN'))
+    pid = worker.proc.pid
+    assert output.count(b'Added record') == 2
+    assert b'WARN' in output
+    big_batch = [b'rec{} {}'.format(i, b'x' * 100) for i in range(0, 2000)]
+    output = worker.index(make_marc(*big_batch))
+    assert output.count(b'Added record') == 2000
+    assert worker.proc.pid == pid
+
+
+def test_solrmarcworker_restarts_and_retries_failed_batch(worker):
+    """
+    If Solrmarc dies while indexing a batch, a SolrmarcWorker should
+    start a new Solrmarc process and send the batch again.
+    """
+    worker.index(make_marc(b'rec1'))
+    pid = worker.proc.pid
+    output = worker.index(make_marc(b'rec2', b'rec3 CRASH'))
+    assert output.count(b'Added record') == 2
+    assert worker.proc.pid != pid
+
+
+def test_solrmarcworker_raises_error_if_batch_not_acknowledged(worker):
+    """
+    If Solrmarc doesn't acknowledge every record in a batch within the
+    timeout, even after retries, a SolrmarcWorker should kill it and
+    raise a SolrmarcError.
+    """
+    worker.timeout = 1
+    worker.index(make_marc(b'rec1'))
+    proc = worker.proc
+    with pytest.raises(solrmarc.SolrmarcError):
+        worker.index(make_marc(b'rec2', b'rec3 SILENT'))
+    assert proc.poll() is not None
+    assert not worker.is_alive()
@@ -0,0 +1,53 @@
+"""
+Tests functions in `export.tasks`.
+"""
+
+import pytest
+
+from export import tasks
+
+
+# FIXTURES AND TEST DATA
+# Fixtures used in the below tests can be found in
+# django/sierra/conftest.py:
+#    sierra_full_object_set
+
+pytestmark = pytest.mark.django_db
+
+
+# TESTS
+
+@pytest.mark.parametrize('records, max, expected', [
+    (None, 2, (0, [])),
+    ([], 2, (0, [])),
+    (['a', 'b', 'c'], 2, (3, [(0, 2, None, None), (2, 3, None, None)])),
+    (['a', 'b', 'c', 'd'], 2, (4, [(0, 2, None, None),
+                                   (2, 4, None, None)])),
+    (['a', 'b', 'c'], 5, (3, [(0, 3, None, None)])),
+])
+def test_plan_chunks_non_querysets(records, max, expected):
+    """
+    For lists (and None), plan_chunks should return the correct count
+    and start/end positions with no PK ranges.
+    """
+    assert tasks.plan_chunks(records, max) == expected
+
+
+@pytest.mark.parametrize('max', [1, 2, 3, 1000])
+def test_plan_chunks_querysets(max, sierra_full_object_set):
+    """
+    For querysets, plan_chunks should return PK ranges that, taken
+    together, select each record in the queryset exactly once, in
+    chunks no larger than max.
+    """
+    records = sierra_full_object_set('Location')
+    count, chunks = tasks.plan_chunks(records, max)
+    all_pks = []
+    for start, end, pk_from, pk_to in chunks:
+        chunk = records.order_by('pk').filter(pk__gte=pk_from, pk__lte=pk_to)
+        chunk_pks = [r.pk for r in chunk]
+        assert len(chunk_pks) == end - start
+        assert len(chunk_pks) <= max
+        all_pks.extend(chunk_pks)
+    assert count == records.count()
+    assert all_pks == sorted(r.pk for r in records)
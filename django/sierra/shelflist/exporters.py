@@ -8,14 +8,11 @@ Solr updated automatically whenever items are loaded.
 '''
 from __future__ import unicode_literals
 import logging
-import json
-
-import pysolr
-
-from django.conf import settings
+import sys, traceback
 
 from export import exporter
 from export import basic_exporters as exporters
+from utils import solr
 from utils.redisobjs import RedisObject
 from . import search_indexes as indexes
 
@@ -23,36 +20,80 @@ from . import search_indexes as indexes
 # set up logger, for debugging
 logger = logging.getLogger('sierra.custom')
 
-def index_shelflist_rows(exp):
+def index_shelflist_rows(exp, locations=None, page_size=1000):
     '''
-    This is what does the work of determining the locations that need
-    to be updated (based on what locations appear in the exporter
-    object's record set) and stuff.
+    This is what does the work of updating the shelflist item manifest
+    (the list of item ids, in shelflist order) for each location in
+    locations--by default, each location that appears in the exporter
+    object's record set. Ids are streamed from Solr page_size at a
+    time (using keyset paging, so later pages cost no more than the
+    first) and compared with the stored manifest, and only the
+    differences are written to Redis, in one step once every page has
+    been compared.
     '''
     exp.log('Info', 'Creating shelflist item manifests.')
-    solr = pysolr.Solr(settings.HAYSTACK_CONNECTIONS[exp.hs_conn]['URL'])
-    records = exp.get_records()
-    locations = records.order_by('location__code').distinct('location__code'
-                        ).values_list('location__code', flat=True)
-    for location in locations:
+    if locations is None:
+        records = exp.get_records()
+        locations = records.order_by('location__code').distinct(
+                        'location__code').values_list('location__code',
+                                                      flat=True)
+    queryset = solr.Queryset(using=exp.hs_conn).filter(type='Item').order_by(
+                    'call_number_type', 'call_number_sort', 'volume_sort',
+                    'copy_number', 'id').only('id')
+    for location in sorted(set(locations)):
         if location:
-            params = {
-                'q': '*:*',
-                'fq': ['type:Item', 'location_code:{}'.format(location)],
-                'fl': 'id',
-                'sort': 'call_number_type asc, call_number_sort asc, volume_sort '
-                        'asc, copy_number asc',
-            }
-            hits = solr.search(rows=0, **params).hits
-            results = solr.search(rows=hits, **params)
-            data = [i['id'] for i in results]
+            results = queryset.filter(location_code=location).iterator(
+                        batch_size=page_size)
             r = RedisObject('shelflistitem_manifest', location)
-            r.set(data)
+            r.sync_list(result['id'] for result in results)
 
 
 class ItemsToSolr(exporters.ItemsToSolr):
     max_rec_chunk = 500
     index_class = indexes.ShelflistItemIndex
+
+    def get_solr_locations(self, ids):
+        '''
+        Returns the set of location codes Solr has for the items with
+        the given ids, before we update or delete them, so that items
+        that move or go away get taken out of their old locations'
+        manifests.
+        '''
+        log_label = self.__class__.__name__
+        if not ids:
+            return set()
+        queryset = solr.Queryset(using=self.hs_conn).filter(type='Item',
+                        id__in=ids).only('location_code')
+        try:
+            return set(r.get('location_code', None)
+                       for r in queryset[0:len(ids)]) - set([None])
+        except Exception as e:
+            ex_type, ex, tb = sys.exc_info()
+            logger.info(traceback.extract_tb(tb))
+            self.log('Error', e, log_label)
+            return set()
+
+    def export_records(self, records, vals={}):
+        locations = self.get_solr_locations([r.pk for r in records])
+        locations |= set(r.location_id for r in records if r.location_id)
+        vals = super(ItemsToSolr, self).export_records(records, vals)
+        vals['locations'] = list(set(vals.get('locations', [])) | locations)
+        return vals
+
+    def delete_records(self, records, vals={}):
+        locations = self.get_solr_locations([r.id for r in records])
+        vals = super(ItemsToSolr, self).delete_records(records, vals)
+        vals['locations'] = list(set(vals.get('locations', [])) | locations)
+        return vals
+
     def final_callback(self, vals={}, status='success'):
+        if type(vals) is list:
+            vals = exporters.collapse_vals(vals)
         super(ItemsToSolr, self).final_callback(vals, status)
-        index_shelflist_rows(self)
+        # Only rebuild manifests for locations that this job's chunks
+        # touched. If we didn't get that info (e.g. the job failed),
+        # rebuild manifests for every location in the record set.
+        locations = None
+        if isinstance(vals, dict) and 'locations' in vals:
+            locations = vals['locations']
+        index_shelflist_rows(self, locations)
@@ -38,6 +38,7 @@ class ShelflistItemSerializer(SimpleSerializerWithLookups):
     fields['inventory_notes'] = {'type': 'str', 'writable': True}
     fields['inventory_date'] = {'type': 'datetime', 'writable': True}
     fields['flags'] = {'type': 'str', 'writable': True}
+    atomic_updates = True
 
     def render_field_name(self, field_name):
         ret_val = field_name
@@ -49,23 +50,37 @@ class ShelflistItemSerializer(SimpleSerializerWithLookups):
         return parser.camel_to_underscore(field_name)
 
     def cache_all_lookups(self):
-        qs = solr.Queryset().filter(type='ItemStatus').only('code', 'label')
-        results = [i for i in qs]
-
-        lookup = {}
-        for r in results:
-            try:
-                lookup[r['code']] = r['label']
-            except KeyError:
-                try:
-                    lookup[r['code']] = None
-                except KeyError:
-                    pass
+        lookup = solr.get_lookups(['ItemStatus'])['ItemStatus']
         self.cache_lookup('status', lookup)
 
+    def cache_all_db_objects(self):
+        '''
+        Looks up row numbers for all of the items being serialized at
+        once, so that a page of items takes one round trip to Redis
+        per location instead of one per item. Row numbers change
+        whenever manifests are rebuilt, so these are cached just for
+        this serializer instance.
+        '''
+        self.row_numbers = {}
+        if isinstance(self.object, (list, tuple)):
+            objects = self.object
+        else:
+            objects = [self.object] if self.object is not None else []
+        ids_by_location = {}
+        for obj in objects:
+            l_code = getattr(obj, 'location_code', None)
+            ids_by_location.setdefault(l_code, []).append(obj.id)
+        for l_code, ids in ids_by_location.iteritems():
+            r = RedisObject('shelflistitem_manifest', l_code)
+            for obj_id, row in r.get_indexes(ids).iteritems():
+                self.row_numbers[(l_code, obj_id)] = row
+
     def process_row_number(self, value, obj):
-        r = RedisObject('shelflistitem_manifest', obj.location_code)
-        return r.get_index(obj.id)
+        try:
+            return self.row_numbers[(obj.location_code, obj.id)]
+        except KeyError:
+            r = RedisObject('shelflistitem_manifest', obj.location_code)
+            return r.get_index(obj.id)
 
     def process_status(self, value, obj):
         '''
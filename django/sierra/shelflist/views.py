@@ -46,8 +46,10 @@ class ShelflistItemList(SimpleGetMixin, SimpleView):
     resource_name = 'shelflistItems'
 
     def get_queryset(self):
+        # Sort the same way shelflist.exporters.index_shelflist_rows
+        # does, so that row numbers in the manifest match rows here.
         return solr.Queryset().filter(type='Item', 
-                    location_code=self.kwargs['code']).order_by('call_number_type', 'call_number_sort', 'volume_sort', 'copy_number')
+                    location_code=self.kwargs['code']).order_by('call_number_type', 'call_number_sort', 'volume_sort', 'copy_number', 'id')
 
 
 # Add SimplePutMixin, SimplePatchMixin before SimpleGetMixin to enable
@@ -0,0 +1,64 @@
+"""
+Contains the `rebuildbrowseindex` manage.py command.
+"""
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from base.search_indexes import ItemIndex
+from utils import solr
+
+
+class Command(BaseCommand):
+    """
+    Run a `rebuildbrowseindex` command from manage.py.
+
+    Fills the call number browse index (the Redis index behind the
+    shelf browse API endpoint) from the items already in Solr. The
+    item exporter keeps the browse index up to date as items are
+    exported, but items exported before the index existed aren't in
+    it, so run this once after upgrading--or any time the index is
+    lost or suspect--instead of re-exporting every item.
+
+    Items are read from Solr in pages of --page-size. Items already in
+    the index are moved if their call numbers have changed. Use
+    --clear to empty the index first, which also drops any ids that
+    are no longer in Solr.
+
+    Example:
+
+    python manage.py rebuildbrowseindex --clear
+    """
+    option_list = BaseCommand.option_list + (
+        make_option('--clear', action='store_true', dest='clear',
+                    default=False,
+                    help='Empty the browse index before rebuilding it.'),
+        make_option('--page-size', action='store', type='int',
+                    dest='page_size', default=1000,
+                    help='Number of items to fetch from Solr at a time.'),
+    )
+
+    def handle(self, *args, **options):
+        browse_index = ItemIndex.browse_index
+        if options['clear']:
+            browse_index.clear()
+        using = settings.EXPORTER_HAYSTACK_CONNECTIONS['ItemsToSolr']
+        queryset = solr.Queryset(using=using).filter(type='Item').only(
+                        'id', 'call_number_type', 'call_number_sort')
+        page_size = options['page_size']
+        entries, count = {}, 0
+        for item in queryset.iterator(batch_size=page_size):
+            cn_sort = item.get('call_number_sort', None)
+            key = None
+            if cn_sort is not None:
+                key = (item.get('call_number_type', None) or 'other', cn_sort)
+            entries[item['id']] = key
+            if len(entries) >= page_size:
+                browse_index.update(entries)
+                count += len(entries)
+                entries = {}
+        browse_index.update(entries)
+        count += len(entries)
+        self.stdout.write('Indexed {} items for call number browsing.'
+                          ''.format(count))
@@ -248,13 +248,17 @@ solr_bibdata_url = get_env_variable('SOLR_BIBDATA_URL',
 solr_marc_url = get_env_variable('SOLR_MARC_URL', 
                     'http://{}:{}/solr/marc'.format(SOLR_HOST, SOLR_PORT))
 
-# HAYSTACK_CONNECTIONS, a required setting for Haystack
+# HAYSTACK_CONNECTIONS, a required setting for Haystack. POOL_SIZE is
+# not a Haystack setting: it sets the maximum number of keep-alive HTTP
+# connections that utils.solr keeps open to that Solr core in each
+# process. If omitted, the requests library default (10) is used.
 HAYSTACK_CONNECTIONS = {
     'default': {
         'ENGINE': 'sierra.solr_backend.CustomSolrEngine',
         'URL': solr_haystack_url,
         'EXCLUDED_INDEXES': ['base.search_indexes.ItemIndex'],
         'TIMEOUT': 60 * 20,
+        'POOL_SIZE': 20,
     },
     'haystack': {
         'ENGINE': 'sierra.solr_backend.CustomSolrEngine',
@@ -286,6 +290,7 @@ REST_FRAMEWORK = {
     'PAGINATE_BY': 20,
     'PAGINATE_BY_PARAM': 'limit',
     'PAGINATE_PARAM': 'offset',
+    'CURSOR_PARAM': 'cursor',
     'ORDER_BY_PARAM': 'order_by',
     'SEARCH_PARAM': 'search',
     'SEARCHTYPE_PARAM': 'searchtype',
@@ -384,9 +389,11 @@ EXPORTER_METADATA_TYPE_REGISTRY = [
     'LocationsToSolr', 'ItypesToSolr', 'ItemStatusesToSolr',
 ]
 
-# The path (relative or absolute) to the command that runs SolrMarc.
-SOLRMARC_COMMAND = get_env_variable('SOLRMARC_COMMAND',
-                                    '../../solr/solrmarc/indexfile.sh')
+# The path (relative or absolute) to the command that runs SolrMarc as
+# a long-lived process that indexes MARC records piped to it, which is
+# how the BibsToSolr exporter runs it (see export.solrmarc).
+SOLRMARC_STREAM_COMMAND = get_env_variable(
+    'SOLRMARC_STREAM_COMMAND', '../../solr/solrmarc/indexstream.sh')
 # The name of the properties file to use when running SolrMarc.
 SOLRMARC_CONFIG_FILE = get_env_variable('SOLRMARC_CONFIG_FILE',
                                         'dev_config.properties')
@@ -417,6 +424,14 @@ REDIS_CONNECTION = {
     'db': get_env_variable('REDIS_APPDATA_DATABASE', 0)
 }
 
+# Lookup tables the API pulls from Solr (Locations, ItemStatuses,
+# Itypes) are cached in Redis so they aren't fetched on every request.
+# LOOKUP_CACHE_TIMEOUT is how long (in seconds) they live in Redis
+# before being fetched again. They're also invalidated whenever one of
+# the metadata exporters (LocationsToSolr, etc.) runs.
+LOOKUP_CACHE_TIMEOUT = int(get_env_variable('LOOKUP_CACHE_TIMEOUT',
+                                            60 * 60 * 24))
+
 # Do we allow access to the admin interface on /admin URL?
 ADMIN_ACCESS = get_env_variable('ADMIN_ACCESS', True)
 
@@ -0,0 +1,99 @@
+'''
+Micro-benchmarks for utils.helpers.NormalizedCallNumber.
+
+Run from the django/sierra directory with:
+
+    python -m utils.benchmarks
+
+Each test normalizes every call number in the corpus for its kind,
+first with an empty cache (cold) and then again with the cache that
+the cold run filled (warm).
+'''
+from datetime import datetime
+
+from utils.helpers import NormalizedCallNumber
+
+# A sample of call numbers from our catalog, grouped by the type
+# that Sierra reports for them.
+CALL_NUMBERS = {
+    'lc': [
+        'M12.B12 B3 1921', 'QA76.73.P98 L88 2013', 'PS3545.I345 Z5 1990',
+        'E184.A1 A6 1993', 'HF5549.5.T7 S57 2002 v.2', 'BF637.C45 C66 1988',
+        'PN1995.9.W6 W66 2007', 'KF4558 14th .A2 1999',
+        'Z695.Z8 L46 2006 c.3', 'ML410.B42 S6 1977 vol. 1',
+        'QH541.15.B56 B56 1994', 'N6537.W28 A4 1970', 'G1201.S1 N3 1999',
+        'TK5105.875.I57 C67 2003', 'DS79.76 .I73 2005',
+        'LB1028.24 .W55 2009 no. 1-4', 'RC455.4.E8 M46 2001',
+        'GV863.A1 B38 1995', 'PR6068.O93 Z46 2000', 'JK1967 .H36 1996',
+    ],
+    'dewey': [
+        '641.5 B9845', '973.7 L63zsa', '523.1 H389b 1988', '005.133 P9967',
+        '782.42164 R727', '796.357 R684s', '616.8527 S654 2004',
+        '813.54 K54it', '025.04 G6265m', '909.82 W927 v.3',
+        '306.874 T389 2000', '155.4 P584g', '370.15 G514 1983 c.2',
+        '599.0188 S2n', '940.5318 W6135n 2006', '428.2 S937',
+    ],
+    'sudoc': [
+        'I 19.2:C 76/3', 'A 1.38:1542', 'HE 20.3152:P 94/2', 'Y 4.F 76/1:F 76',
+        'C 3.134:997', 'D 101.2:H 34/2', 'EP 1.23/2:600/R-95/078',
+        'I 29.9/5:315', 'L 2.3:2340', 'PREX 2.8:997', 'Y 3.2:C 73/R 29',
+        'SI 1.2:B 53', 'ED 1.2:T 22/7', 'T 22.44/2:1040/2003',
+        'HE 20.3002:D 56/2', 'A 13.88:PNW-GTR-389', 'C 55.2:OC 2/999',
+        'D 114.2:M 69', 'NAS 1.15:4563', 'GA 1.13:RCED-97-64',
+    ],
+    'other': [
+        'LPCD100,000', 'LPCD 100,000', 'LPCD 100000', 'MPCD 4,551',
+        'VIDEO 1,045', 'DVD 12,345', 'FOLIO 12', 'THESIS 2003 SMITH',
+        'MICROFICHE 1,024', 'CD-ROM 221', 'GAME 53', 'LPCD 1-4',
+    ],
+    'search': [
+        'M12.B12 B3 1921', 'QA76.73.P98', 'I 19.2:C 76/3', '641.5 B9845',
+        'LPCD100,000', 'pn1995.9.w6', 'E184.A1 A6 1993', '813.54',
+    ],
+    'default': [
+        'v.1', 'V. 2', 'vol 13', 'no. 4', 'c.2', 'copy 3', 'Bd. 12',
+        'v.1-4', 't. 1, pt. 2', 'v.12:no.3', 'Suppl. 1', '1999',
+    ],
+}
+
+
+def normalize_corpus(kind, calls, repeat=100):
+    for i in range(0, repeat):
+        NormalizedCallNumber.normalize_many(calls, kind)
+    return len(calls) * repeat
+
+
+def timeit(func, *args, **kwargs):
+    t0 = datetime.now()
+    result = func(*args, **kwargs)
+    t1 = datetime.now()
+    diff = t1 - t0
+    return {'secs': diff.total_seconds(), 'return_value': result}
+
+
+def run_benchmarks(repeat=100):
+    results = {}
+    for kind, calls in CALL_NUMBERS.items():
+        NormalizedCallNumber.cache.clear()
+        results[kind] = {
+            'cold': timeit(normalize_corpus, kind, calls, 1),
+            'warm': timeit(normalize_corpus, kind, calls, repeat),
+        }
+    return results
+
+
+def print_results(results):
+    for kind in sorted(results.keys()):
+        print kind + ' Test Results ---------------------------------\n'
+        for run in ('cold', 'warm'):
+            result = results[kind][run]
+            count = result['return_value']
+            secs = result['secs'] or 0.000001
+            print '    ' + run + ': ' + str(count) + ' call numbers in '\
+                  + str(round(secs, 4)) + ' seconds ('\
+                  + str(int(count / secs)) + ' per second)'
+        print ''
+
+
+if __name__ == "__main__":
+    print_results(run_benchmarks())
@@ -5,6 +5,8 @@ code.
 from __future__ import unicode_literals
 import operator
 import re
+import threading
+from collections import OrderedDict
 
 from django.db.models import Q
 
@@ -61,10 +63,113 @@ def get_varfield_vals(vf_set, tag, marc_tags=['*'], many=False,
         return values
 
 
+class LRUCache(object):
+    '''
+    Simple, bounded, least-recently-used cache. Once maxsize items
+    are stored, setting a new item evicts whichever item was used
+    least recently. Tracks hits and misses so you can tell whether
+    the cache is actually helping.
+
+    >>> cache = LRUCache(maxsize=2)
+    >>> cache.set('a', 1)
+    >>> cache.get('a')
+    1
+    >>> cache.get('b') is None
+    True
+    >>> cache.hits, cache.misses
+    (1, 1)
+    '''
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        '''
+        Returns the value stored under key, or default if there isn't
+        one. Counts a hit or a miss.
+        '''
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        '''
+        Stores value under key, evicting the least recently used item
+        if the cache is full.
+        '''
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        '''
+        Empties the cache and resets the hit/miss counters.
+        '''
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._data), 'maxsize': self.maxsize}
+
+
 class CallNumberError(Exception):
     pass
 
 
+# Compiled patterns used by NormalizedCallNumber. Call number
+# normalization runs for every item and bib we index, so we compile
+# these once here instead of on every call.
+_CN_PATTERNS = {
+    'trim': re.compile(r'^\s*(.*)\s*$'),
+    'multi_space': re.compile(r'\s{2,}'),
+    'thousands': re.compile(r'(\d{1,3}),(\d)'),
+    'range': re.compile(r'(\d)\s*\-+\s*\d+'),
+    'label_cs': re.compile(r'(^|\s+)[A-Za-z]?[a-z]+[. ]*(\d)'),
+    'label_ci': re.compile(r'(^|\s+)[A-Za-z]+[. ]*(\d)'),
+    'dec_after_nondigit': re.compile(r'([^ \d])\.'),
+    'dec_before_nondigit': re.compile(r'\.([^ \d])'),
+    'nondigit_digit': re.compile(r'([^ .\d])(\d)'),
+    'digit_nondigit': re.compile(r'(\d)([^ .\d])'),
+    'decimal_number': re.compile(r'^\d*\.?\d+$'),
+    'integer': re.compile(r'^\d+$'),
+    'trailing_zero': re.compile(r'\.0$'),
+    'sudoc_suffix_dec': re.compile(r'\.(\d)'),
+    'sudoc_year_9xx': re.compile(r'(^|\D)(9\d\d)($|\D)'),
+    'sudoc_year_2xxx': re.compile(r'(^|\D)(2\d\d\d)($|\D)'),
+    'sudoc_letters': re.compile(r'([^A-Z .])([A-Z]+)'),
+    'sudoc_periods': re.compile(r'([^.])(\.)'),
+    'sudoc_separators': re.compile(r'[/\-:]'),
+    'lc_lower_period': re.compile(r'([a-z])\.\s*'),
+    'lc_class_digit': re.compile(r'^([A-Z]+)(\d)'),
+    'search_strip': re.compile(r'[\s./,?\-]'),
+}
+
+
 class NormalizedCallNumber(object):
     '''
     Class to normalize a call number string--e.g., to make it sortable.
@@ -80,13 +185,20 @@ class NormalizedCallNumber(object):
     >>> ncn = NormalizedCallNumber(callnumber, 'search').normalize()
     >>> ncn
     u'M12B12B31921'
+    >>> NormalizedCallNumber.normalize_many(['M12.B12', 'M2.B1'], 'lc')
+    [u'M!0000000012!B12', u'M!0000000002!B1']
 
     Specify what kind of normalization you want to do using the "kind"
     parameter upon init. If you want to add new kinds, simply add a
     _process_{kind} method, and then initialize new objects using that
     kind string. Use the normalize method to get the normalized string.
+
+    Normalized values are cached in a class-level LRUCache, keyed on
+    (class, call, kind), since the same call numbers tend to come up
+    over and over (e.g., for every item on a bib).
     '''
     space_char = '!'
+    cache = LRUCache(maxsize=20000)
 
     def __init__(self, call, kind='default'):
         self.kind = kind
@@ -99,21 +211,35 @@ class NormalizedCallNumber(object):
         self.kind. Stores it in self.normalized_call and returns it. 
         '''
         kind = self.kind
-        call = self.call
-        process_it = getattr(self, '_process_{}'.format(kind), 
-                             self._process_default)
-        try:
-            call = process_it(unicode(call))
-        except CallNumberError:
-            raise
-
-        self.normalized_call = re.sub(r' ', self.space_char, call)
+        call = unicode(self.call)
+        key = (self.__class__, call, kind)
+        normalized_call = self.cache.get(key)
+        if normalized_call is None:
+            process_it = getattr(self, '_process_{}'.format(kind), 
+                                 self._process_default)
+            try:
+                call = process_it(call)
+            except CallNumberError:
+                raise
+
+            normalized_call = call.replace(' ', self.space_char)
+            self.cache.set(key, normalized_call)
+        self.normalized_call = normalized_call
         return self.normalized_call
 
+    @classmethod
+    def normalize_many(cls, calls, kind='default'):
+        '''
+        Normalizes an iterable of call numbers that are all the same
+        kind. Returns a list of normalized strings in the same order.
+        '''
+        return [cls(call, kind).normalize() for call in calls]
+
     def _process_sudoc(self, call=None):
         '''
         Processes sudoc (gov docs) numbers.
         '''
+        p = _CN_PATTERNS
         call = self.call if call is None else call
         call = call.upper()
         call = self._normalize_spaces(call)
@@ -130,19 +256,19 @@ class NormalizedCallNumber(object):
         # need to ensure stems all have the same format so that the
         # sort compares stem to stem correctly. Stems may or may not
         # have, e.g., /7-1 at the end. We add whatever is missing.
-        stem = re.sub(r'\.', ' ', stem)
-        if not re.search(r'/', stem):
+        stem = stem.replace('.', ' ')
+        if '/' not in stem:
             stem = '{}/0'.format(stem)
-        if not re.search(r'-', stem):
+        if '-' not in stem:
             stem = '{}-0'.format(stem)
         
         # For suffixes: years (which, pre-2000, left off the leading 1)
         # sort first. Letters sort next. Non-year numbers sort third.
         # So to force sorting first, we add a period to the beginning
         # of years. (Letters are taken care of below.)
-        suffix = re.sub(r'\.(\d)', r' \1', suffix)
-        suffix = re.sub(r'(^|\D)(9\d\d)($|\D)', r'\1.\2\3', suffix)
-        suffix = re.sub(r'(^|\D)(2\d\d\d)($|\D)', r'\1.\2\3', suffix)
+        suffix = p['sudoc_suffix_dec'].sub(r' \1', suffix)
+        suffix = p['sudoc_year_9xx'].sub(r'\1.\2\3', suffix)
+        suffix = p['sudoc_year_2xxx'].sub(r'\1.\2\3', suffix)
 
         # Now we reattach the stem and the suffix and process the whole
         # thing as a string. We want numbers--but not numbers after
@@ -153,10 +279,10 @@ class NormalizedCallNumber(object):
         # Here's where we add the periods to the beginning of letters.
         # Note that letters that belong to the first part of the stem
         # don't get periods, while others do.
-        ret = re.sub(r'([^A-Z .])([A-Z]+)', r'\1.\2', ret)
+        ret = p['sudoc_letters'].sub(r'\1.\2', ret)
         # Finally, we ensure things are spaced out reasonably.
-        ret = re.sub(r'([^.])(\.)', r'\1 \2', ret)
-        ret = re.sub(r'[/\-:]', ' ', ret)
+        ret = p['sudoc_periods'].sub(r'\1 \2', ret)
+        ret = p['sudoc_separators'].sub(' ', ret)
         ret = self._normalize_spaces(ret)
         return ret
 
@@ -175,16 +301,17 @@ class NormalizedCallNumber(object):
         '''
         Processes Library of Congress call numbers.
         '''
+        p = _CN_PATTERNS
         call = self.call if call is None else call
         call = self._normalize_spaces(call)
-        call = re.sub(r'([a-z])\.\s*', r'\1 ', call)
+        call = p['lc_lower_period'].sub(r'\1 ', call)
         call = call.upper()
         call = self._normalize_numbers(call)
         call = self._normalize_decimals(call)
         # separate the digit that follows the 1st set of letters
-        call = re.sub(r'^([A-Z]+)(\d)', r'\1 \2', call)
+        call = p['lc_class_digit'].sub(r'\1 \2', call)
         # separate non-digits after numbers
-        call = re.sub(r'(\d)([^ .\d])', r'\1 \2', call)
+        call = p['digit_nondigit'].sub(r'\1 \2', call)
         call = self._numbers_to_sortable_strings(call)
         return call
 
@@ -207,7 +334,7 @@ class NormalizedCallNumber(object):
         '''
         call = self.call if call is None else call
         call = call.upper()
-        call = re.sub(r'[\s./,?\-]', r'', call)
+        call = _CN_PATTERNS['search_strip'].sub('', call)
         return call
 
     def _process_default(self, call=None):
@@ -231,8 +358,8 @@ class NormalizedCallNumber(object):
         multiple spaces.
         '''
         data = self.call if data is None else data
-        data = re.sub(r'^\s*(.*)\s*$', r'\1', data)
-        data = re.sub(r'\s{2,}', ' ', data)
+        data = _CN_PATTERNS['trim'].sub(r'\1', data)
+        data = _CN_PATTERNS['multi_space'].sub(' ', data)
         return data
 
     def _normalize_numbers(self, data=None):
@@ -241,8 +368,8 @@ class NormalizedCallNumber(object):
         ranges to remove the hyphen and the second number.
         '''
         data = self.call if data is None else data
-        data = re.sub(r'(\d{1,3}),(\d)', r'\1\2', data)
-        data = re.sub(r'(\d)\s*\-+\s*\d+', r'\1', data)
+        data = _CN_PATTERNS['thousands'].sub(r'\1\2', data)
+        data = _CN_PATTERNS['range'].sub(r'\1', data)
         return data
 
     def _remove_labels(self, data=None, case_sensitive=True):
@@ -257,9 +384,9 @@ class NormalizedCallNumber(object):
         '''
         data = self.call if data is None else data
         if case_sensitive:
-            data = re.sub(r'(^|\s+)[A-Za-z]?[a-z]+[. ]*(\d)', r'\1\2', data)
+            data = _CN_PATTERNS['label_cs'].sub(r'\1\2', data)
         else:
-            data = re.sub(r'(^|\s+)[A-Za-z]+[. ]*(\d)', r'\1\2', data)
+            data = _CN_PATTERNS['label_ci'].sub(r'\1\2', data)
         return data
 
     def _normalize_decimals(self, data=None):
@@ -268,8 +395,8 @@ class NormalizedCallNumber(object):
         decimals that do involve digits.
         '''
         data = self.call if data is None else data
-        data = re.sub(r'([^ \d])\.', r'\1 .', data)
-        data = re.sub(r'\.([^ \d])', r'\1', data)
+        data = _CN_PATTERNS['dec_after_nondigit'].sub(r'\1 .', data)
+        data = _CN_PATTERNS['dec_before_nondigit'].sub(r'\1', data)
         return data
 
     def _separate_numbers(self, data=None):
@@ -277,8 +404,8 @@ class NormalizedCallNumber(object):
         Separates numbers/decimals from non-numbers, using spaces.
         '''
         data = self.call if data is None else data
-        data = re.sub(r'([^ .\d])(\d)', r'\1 \2', data)
-        data = re.sub(r'(\d)([^ .\d])', r'\1 \2', data)
+        data = _CN_PATTERNS['nondigit_digit'].sub(r'\1 \2', data)
+        data = _CN_PATTERNS['digit_nondigit'].sub(r'\1 \2', data)
         return data
 
     def _numbers_to_sortable_strings(self, data=None, decimals=True):
@@ -286,12 +413,11 @@ class NormalizedCallNumber(object):
         Formats numeric components so they'll sort as strings.
         '''
         data = self.call if data is None else data
+        number = _CN_PATTERNS['decimal_number' if decimals else 'integer']
         parts = []
         for x in data.split(' '):
-            if ((decimals and re.search(r'^\d*\.?\d+$', x))
-                or (not decimals and re.search(r'^\d+$', x))):
+            if number.search(x):
                 x = '{:010d}{}'.format(int(float(x)), unicode(float(x)%1)[1:])
-                x = re.sub(r'\.0$', '', x)
+                x = _CN_PATTERNS['trailing_zero'].sub('', x)
             parts.append(x)
         return ' '.join(parts)
-
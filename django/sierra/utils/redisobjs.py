@@ -1,31 +1,62 @@
 import json
+import itertools
 
 import redis
 
 from django.conf import settings
 
+from utils import helpers
+
 
 class RedisObject(object):
+    '''
+    Stores and retrieves Python data in Redis, as JSON. Lists and
+    tuples are stored as sorted sets (scored by position), dicts as
+    hashes, and anything else as a string.
+
+    For big lists and dicts, prefer the incremental methods (append,
+    remove, update_list, set_fields, get_fields, delete_fields) over
+    set and get, which rewrite or read the whole key; to bring a big
+    list up to date, stream the new version through sync_list. Bulk
+    writes are sent in batches of batch_size items.
+    '''
     conn = redis.StrictRedis(**settings.REDIS_CONNECTION)
+    batch_size = 1000
 
     def __init__(self, entity, id):
         self.entity = entity
         self.id = id
         self.key = '{}:{}'.format(entity, id)
 
+    def _zadd(self, pipe, scored_items):
+        args = []
+        for score, item in scored_items:
+            args.extend([score, json.dumps(item)])
+            if len(args) >= self.batch_size * 2:
+                pipe.zadd(self.key, *args)
+                args = []
+        if args:
+            pipe.zadd(self.key, *args)
+
+    def _hmset(self, pipe, data):
+        mapping = {}
+        for k, v in data.iteritems():
+            mapping[k] = json.dumps(v)
+            if len(mapping) >= self.batch_size:
+                pipe.hmset(self.key, mapping)
+                mapping = {}
+        if mapping:
+            pipe.hmset(self.key, mapping)
+
     def set(self, data):
         pipe = self.conn.pipeline()
         pipe.delete(self.key)
 
         if isinstance(data, (list, tuple)):
-            i = 0
-            for item in data:
-                pipe.zadd(self.key, i, json.dumps(item))
-                i += 1
+            self._zadd(pipe, enumerate(data))
 
         elif isinstance(data, dict):
-            for k, v in data.iteritems():
-                pipe.hset(self.key, k, json.dumps(v))
+            self._hmset(pipe, data)
 
         else:
             pipe.set(self.key, json.dumps(data))
@@ -74,6 +105,18 @@ class RedisObject(object):
         except IndexError:
             return None
 
+    def get_indexes(self, values):
+        '''
+        Like get_index, but gets indexes for a batch of values at once,
+        in one round trip. Returns a dict mapping each value to its
+        index, or to None if it isn't in the list.
+        '''
+        values = list(values)
+        pipe = self.conn.pipeline(transaction=False)
+        for value in values:
+            pipe.zrank(self.key, json.dumps(value))
+        return dict(zip(values, pipe.execute()))
+
     def get_value(self, index):
         try:
             return json.loads(self.conn.zrange(self.key, index, index)[0])
@@ -81,4 +124,331 @@ class RedisObject(object):
             return None
 
     def get_datatype(self):
-        return self.conn.type(self.key)
\ No newline at end of file
+        return self.conn.type(self.key)
+
+    def set_fields(self, data):
+        '''
+        Sets the hash fields in the data dict, leaving any other
+        fields in the hash alone.
+        '''
+        pipe = self.conn.pipeline()
+        self._hmset(pipe, data)
+        pipe.execute()
+        return data
+
+    def get_fields(self, fields):
+        '''
+        Gets a batch of hash fields at once. Returns a dict; fields
+        that don't exist in the hash are left out.
+        '''
+        fields = list(fields)
+        ret = {}
+        for i in range(0, len(fields), self.batch_size):
+            batch = fields[i:i+self.batch_size]
+            values = self.conn.hmget(self.key, batch)
+            ret.update({f: json.loads(v) for f, v in zip(batch, values)
+                        if v is not None})
+        return ret
+
+    def delete_fields(self, fields):
+        fields = list(fields)
+        pipe = self.conn.pipeline()
+        for i in range(0, len(fields), self.batch_size):
+            pipe.hdel(self.key, *fields[i:i+self.batch_size])
+        pipe.execute()
+
+    def append(self, items):
+        '''
+        Adds items to the end of a list (sorted set) without rewriting
+        the rest of the list. Note that, after an append or remove,
+        scores no longer necessarily match list positions, so don't
+        mix these with set_value.
+        '''
+        items = list(items)
+        if items:
+            last = self.conn.zrange(self.key, -1, -1, withscores=True)
+            start = int(last[0][1]) + 1 if last else 0
+            pipe = self.conn.pipeline()
+            self._zadd(pipe, enumerate(items, start))
+            pipe.execute()
+        return items
+
+    def remove(self, items):
+        '''
+        Removes items from a list (sorted set), wherever they are.
+        '''
+        items = [json.dumps(i) for i in items]
+        pipe = self.conn.pipeline()
+        for i in range(0, len(items), self.batch_size):
+            pipe.zrem(self.key, *items[i:i+self.batch_size])
+        pipe.execute()
+
+    def update_list(self, data, old_data=None):
+        '''
+        Makes the stored list match data, by removing and appending
+        only the items that changed. Falls back to set when the items
+        the two lists share aren't in the same order, or when new
+        items aren't all at the end. Pass old_data if you already
+        have the current list, to save a read.
+        '''
+        old_data = self.get() if old_data is None else old_data
+        if not old_data:
+            return self.set(data)
+
+        old_set, new_set = set(old_data), set(data)
+        kept = [i for i in data if i in old_set]
+        added = data[len(kept):]
+        if (kept != [i for i in old_data if i in new_set]
+                or any(i in old_set for i in added)):
+            return self.set(data)
+
+        self.remove([i for i in old_data if i not in new_set])
+        self.append(added)
+        return data
+
+    def sync_list(self, items, page_size=None):
+        '''
+        Makes the stored list (sorted set) match the items iterable
+        by writing only what has changed, without holding either list
+        in memory. Items are consumed a page at a time and compared
+        with the members stored at the same positions: members already
+        at the right position are left alone, other members stored at
+        those positions are stale, and the page's remaining items need
+        (re-)scoring. Once every page has been compared, the stale
+        members are removed, the changed members are added, and
+        anything stored past the end of the new list is trimmed, all
+        in one MULTI/EXEC, so readers see either the old list or the
+        new one and never a partly-updated one. Only the changes are
+        kept in memory until then. Returns the length of the new list.
+        '''
+        page_size = page_size or self.batch_size
+        items = iter(items)
+        stale, changed = [], []
+        start = 0
+        while True:
+            page = [json.dumps(i) for i in itertools.islice(items, page_size)]
+            if not page:
+                break
+            end = start + len(page) - 1
+            old = dict(self.conn.zrangebyscore(self.key, start, end,
+                                               withscores=True))
+            new = set(page)
+            stale.extend([m for m in old if m not in new])
+            for score, member in enumerate(page, start):
+                if old.get(member) != score:
+                    changed.extend([score, member])
+            start = end + 1
+        # A member that moved shows up in stale (for its old position)
+        # and in changed (for its new one), so the removes have to go
+        # before the adds.
+        pipe = self.conn.pipeline(transaction=True)
+        for n in range(0, len(stale), self.batch_size):
+            pipe.zrem(self.key, *stale[n:n + self.batch_size])
+        for n in range(0, len(changed), self.batch_size * 2):
+            pipe.zadd(self.key, *changed[n:n + self.batch_size * 2])
+        pipe.zremrangebyscore(self.key, start, '+inf')
+        pipe.execute()
+        return start
+
+
+class RedisLookupCache(object):
+    '''
+    Two-level cache for small lookup tables (e.g. code => label dicts)
+    that many processes need and that rarely change. Each table is
+    stored in Redis (as a RedisObject hash) with a TTL, and each
+    process keeps a local LRUCache of what it got from Redis.
+
+    Tables are keyed on a version number kept in Redis. Calling
+    invalidate() bumps the version, which invalidates the cache for
+    every process at once; old tables simply expire from Redis. Use
+    get_many to get several tables at once: fetch is called (once)
+    with a list of the names that weren't cached and should return a
+    dict mapping those names to their tables.
+
+    An empty hash can't exist in Redis, so an empty table is stored as
+    the JSON string EMPTY instead; otherwise empty tables would never
+    be cached and would hit fetch on every call.
+    '''
+    EMPTY = '{}'
+
+    def __init__(self, entity, timeout=None, local_maxsize=100):
+        self.entity = entity
+        self.timeout = timeout
+        self.version_key = '{}_version'.format(entity)
+        self.local = helpers.LRUCache(maxsize=local_maxsize)
+
+    def get_version(self):
+        return int(RedisObject.conn.get(self.version_key) or 0)
+
+    def get_many(self, names, fetch):
+        version = self.get_version()
+        tables, missing = {}, []
+        for name in names:
+            table = self.local.get((version, name))
+            if table is None:
+                table = RedisObject(self.entity,
+                                    '{}:{}'.format(version, name)).get()
+                if table is not None:
+                    self.local.set((version, name), table)
+            if table is None:
+                missing.append(name)
+            else:
+                tables[name] = table
+
+        if missing:
+            fetched = fetch(missing)
+            pipe = RedisObject.conn.pipeline()
+            for name in missing:
+                table = fetched.get(name, {})
+                key = RedisObject(self.entity,
+                                  '{}:{}'.format(version, name)).key
+                pipe.delete(key)
+                if table:
+                    for k, v in table.iteritems():
+                        pipe.hset(key, k, json.dumps(v))
+                else:
+                    pipe.set(key, self.EMPTY)
+                if self.timeout:
+                    pipe.expire(key, self.timeout)
+                tables[name] = table
+                self.local.set((version, name), table)
+            pipe.execute()
+        return tables
+
+    def get(self, name, fetch):
+        return self.get_many([name], fetch)[name]
+
+    def invalidate(self):
+        '''
+        Invalidates all cached tables, in Redis and in every process.
+        '''
+        RedisObject.conn.incr(self.version_key)
+        self.local.clear()
+
+
+class RedisSortedIndex(object):
+    '''
+    Keeps ids in order by a sort key, so that we can quickly find the
+    ids just before or after a given id or sort key--e.g., items in
+    call number order for shelf browsing. Each id is stored in a
+    sorted set (with every score 0, so Redis orders members
+    lexicographically) as its sort key parts plus the id, joined by
+    NUL characters. A hash maps each id to its current member, so an
+    id can be moved or removed without knowing its old sort key.
+
+    Sort keys are tuples of strings. Use the `within` argument of the
+    lookup methods to keep results within one group of sort keys that
+    share leading parts (e.g. one call number type). Lookups and
+    updates are O(log n) per id.
+    '''
+    conn = RedisObject.conn
+    batch_size = 1000
+    sep = '\x00'
+
+    def __init__(self, entity, id):
+        self.entity = entity
+        self.id = id
+        self.key = '{}:{}'.format(entity, id)
+        self.members_key = '{}:members'.format(self.key)
+
+    def _encode(self, val):
+        if isinstance(val, unicode):
+            return val.encode('utf-8')
+        return str(val)
+
+    def make_member(self, sort_key, id):
+        return self.sep.join([self._encode(p) for p in sort_key]
+                             + [self._encode(id)])
+
+    def parse_member(self, member):
+        parts = [p.decode('utf-8') for p in member.split(self.sep)]
+        return tuple(parts[:-1]), parts[-1]
+
+    def _prefix(self, within):
+        if not within:
+            return ''
+        return self.sep.join([self._encode(p) for p in within]) + self.sep
+
+    def update(self, entries):
+        '''
+        Adds, moves, or removes ids. entries is a dict mapping each id
+        to its sort key, or to None to remove that id from the index.
+        Members that haven't changed aren't touched.
+        '''
+        entries = [(self._encode(id), key) for id, key in entries.iteritems()]
+        for i in range(0, len(entries), self.batch_size):
+            batch = entries[i:i+self.batch_size]
+            ids = [id for id, key in batch]
+            old_members = self.conn.hmget(self.members_key, ids)
+            pipe = self.conn.pipeline()
+            for (id, key), old in zip(batch, old_members):
+                new = None if key is None else self.make_member(key, id)
+                if new == old:
+                    continue
+                if old is not None:
+                    pipe.zrem(self.key, old)
+                if new is None:
+                    pipe.hdel(self.members_key, id)
+                else:
+                    pipe.zadd(self.key, 0, new)
+                    pipe.hset(self.members_key, id, new)
+            pipe.execute()
+
+    def remove(self, ids):
+        self.update({id: None for id in ids})
+
+    def clear(self):
+        self.conn.delete(self.key, self.members_key)
+
+    def get_sort_key(self, id):
+        member = self.conn.hget(self.members_key, self._encode(id))
+        return None if member is None else self.parse_member(member)[0]
+
+    def _bounds(self, within):
+        '''
+        Returns the (lower, upper) lex range bounds that cover the
+        group of members given by within, or the whole index.
+        '''
+        prefix = self._prefix(within)
+        if not prefix:
+            return '-', '+'
+        return '[{}'.format(prefix), '({}\x01'.format(prefix[:-1])
+
+    def _range(self, start, before, after, within):
+        '''
+        Returns a tuple (before_list, after_list) of up to before
+        (sort key, id) pairs that sort before the value of start, a
+        lex range bound (the value prefixed with [ or (), and up to
+        after pairs from start on, counting only the given group.
+        '''
+        lower, upper = self._bounds(within)
+        prev_members, next_members = [], []
+        if before > 0:
+            prev_members = self.conn.zrevrangebylex(self.key,
+                                '({}'.format(start[1:]), lower, 0, before)
+        if after > 0:
+            next_members = self.conn.zrangebylex(self.key, start, upper, 0,
+                                                 after)
+        return ([self.parse_member(m) for m in reversed(prev_members)],
+                [self.parse_member(m) for m in next_members])
+
+    def neighbors(self, id, before=10, after=10, within=None):
+        '''
+        Returns a tuple (before_list, after_list) of the (sort key,
+        id) pairs that come just before and just after the given id,
+        each in index order, counting only ids within the given group.
+        Returns None if the id isn't in the index.
+        '''
+        member = self.conn.hget(self.members_key, self._encode(id))
+        if member is None:
+            return None
+        return self._range('({}'.format(member), before, after, within)
+
+    def around(self, sort_key, before=10, after=10, within=None):
+        '''
+        Returns a tuple (before_list, after_list) of the (sort key,
+        id) pairs that sort just before the given sort key and those
+        that sort at or just after it, each in index order.
+        '''
+        key = self.sep.join([self._encode(p) for p in sort_key])
+        return self._range('[{}'.format(key), before, after, within)
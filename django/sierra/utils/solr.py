@@ -3,26 +3,163 @@ Provides Django queryset functionality on top of Solr search results.
 """
 import re
 import copy
+import json
+import threading
 from datetime import datetime
+from xml.etree import ElementTree as ET
 
 import pysolr
+from requests.adapters import HTTPAdapter
 
 from django.core.exceptions import ImproperlyConfigured
 from django.conf import settings
 
+from utils import redisobjs
+
 import logging
 # set up logger, for debugging
 logger = logging.getLogger('sierra.custom')
 
 
+# Connections are shared by everything in the process that talks to
+# the same Solr URL with the same timeout, so that keep-alive HTTP
+# connections get reused. See connect.
+_connections = {}
+_connections_lock = threading.Lock()
+_request_stats = threading.local()
+# Schema field flags from Solr's Luke handler, per Solr URL. See
+# sort_missing_last.
+_schema_flags = {}
+
+
+class Solr(pysolr.Solr):
+    """
+    pysolr.Solr that counts the requests it sends to Solr, per thread,
+    so that we can tell how many Solr requests it took to do something
+    (like answer an API request). See get_request_count.
+    """
+    def _send_request(self, method, path='', body=None, headers=None,
+                      files=None):
+        _request_stats.count = get_request_count() + 1
+        return super(Solr, self)._send_request(method, path, body, headers,
+                                               files)
+
+
+def get_request_count():
+    """
+    Returns the number of Solr requests made in the current thread
+    since the last reset_request_count().
+    """
+    return getattr(_request_stats, 'count', 0)
+
+
+def reset_request_count():
+    _request_stats.count = 0
+
+
 def connect(url=None, using='default', **kwargs):
+    """
+    Returns a pysolr.Solr object for the given url or, if no url is
+    provided, for the URL of the given Haystack connection. Solr
+    objects are pooled: one is created per (url, timeout) in each
+    process and then reused, along with its HTTP session. If the
+    Haystack connection has a POOL_SIZE, it sets the maximum number of
+    keep-alive HTTP connections kept open for that session.
+    """
+    pool_size = None
     if not url:
         try:
             url = settings.HAYSTACK_CONNECTIONS[using]['URL']
         except KeyError:
             raise ImproperlyConfigured('Haystack connection {} does not '
                                        'exist.'.format(using))
-    return pysolr.Solr(url, **kwargs)
+        pool_size = settings.HAYSTACK_CONNECTIONS[using].get('POOL_SIZE')
+    key = (url, kwargs.get('timeout', 60))
+    conn = _connections.get(key, None)
+    if conn is None:
+        with _connections_lock:
+            conn = _connections.get(key, None)
+            if conn is None:
+                conn = Solr(url, **kwargs)
+                if pool_size:
+                    adapter = HTTPAdapter(pool_maxsize=pool_size)
+                    conn.session.mount('http://', adapter)
+                    conn.session.mount('https://', adapter)
+                _connections[key] = conn
+    return conn
+
+
+def sort_missing_last(conn, field):
+    """
+    Returns True if docs with no value for field sort after docs that
+    have one, in both directions, on the Solr that conn connects to--
+    i.e., if the field's type has sortMissingLast set. Field flags are
+    fetched from Solr's Luke handler once per Solr URL. Fields that
+    aren't in the schema return False.
+    """
+    flags = _schema_flags.get(conn.url, None)
+    if flags is None:
+        response = json.loads(conn._send_request(
+            'get', 'admin/luke?show=schema&wt=json'))
+        schema = response['schema']
+        flags = {
+            'fields': {name: f.get('flags', '')
+                       for name, f in schema.get('fields', {}).items()},
+            'dynamic': sorted([(pattern, f.get('flags', '')) for pattern, f
+                               in schema.get('dynamicFields', {}).items()],
+                              key=lambda d: len(d[0]), reverse=True)
+        }
+        _schema_flags[conn.url] = flags
+    field_flags = flags['fields'].get(field, None)
+    if field_flags is None:
+        for pattern, dyn_flags in flags['dynamic']:
+            if ((pattern.startswith('*') and field.endswith(pattern[1:]))
+                    or (pattern.endswith('*')
+                        and field.startswith(pattern[:-1]))):
+                field_flags = dyn_flags
+                break
+    # In Luke's field flags, l means sortMissingLast (L means lazy).
+    return 'l' in (field_flags or '')
+
+
+def atomic_update(docs, op='set', key=None, url=None, using='default',
+                  conn=None, commit=True):
+    """
+    Sends atomic (partial) updates for a batch of documents to Solr in
+    one request, so that only the fields being changed are sent rather
+    than whole documents. Each doc in docs is a dict containing the
+    unique key field (key, which defaults to settings.HAYSTACK_ID_FIELD)
+    plus the fields to update. op is the Solr update operation to use
+    for each field: 'set' (replace the value; an empty list or None
+    removes the field), 'add' (append to a multi-valued field), or
+    'inc' (increment a number).
+
+    Note that atomic updates require Solr to have the updateLog turned
+    on and all fields stored, which is true for our haystack core.
+    """
+    if not docs:
+        return None
+    key = key or getattr(settings, 'HAYSTACK_ID_FIELD', 'id')
+    conn = conn or connect(url=url, using=using)
+    message = ET.Element('add')
+    for doc in docs:
+        doc_elem = ET.SubElement(message, 'doc')
+        key_elem = ET.SubElement(doc_elem, 'field', name=key)
+        key_elem.text = conn._from_python(doc[key])
+        for field, value in doc.iteritems():
+            if field == key:
+                continue
+            if not isinstance(value, (list, tuple)):
+                value = [value]
+            if op == 'set' and all([v is None for v in value]):
+                ET.SubElement(doc_elem, 'field', name=field, update=op,
+                              null='true')
+            for v in [v for v in value if v is not None]:
+                field_elem = ET.SubElement(doc_elem, 'field', name=field,
+                                           update=op)
+                field_elem.text = conn._from_python(v)
+    message = pysolr.force_unicode(ET.tostring(message, encoding='utf-8'))
+    return conn._update(message, commit=commit)
 
 
 class MultipleObjectsReturned(Exception):
@@ -40,7 +177,19 @@ class Result(dict):
         super(Result, self).__init__(*args, **kwargs)
         self.__dict__ = self
 
-    def save(self, url=None, using='default', **kwargs):
+    def save(self, url=None, using='default', fields=None, **kwargs):
+        """
+        Saves this Result back to Solr. By default the whole document
+        is re-posted; pass a list of field names as fields to send
+        only those fields, as an atomic update.
+        """
+        if fields is not None:
+            key = getattr(settings, 'HAYSTACK_ID_FIELD', 'id')
+            doc = {f: self.get(f, None) for f in fields}
+            doc[key] = self[key]
+            atomic_update([doc], op='set', key=key, url=url, using=using,
+                          commit=kwargs.get('commit', True))
+            return
         conn = connect(url, using)
         try:
             del(self['_version_'])
@@ -50,6 +199,14 @@ class Result(dict):
 
 
 class Queryset(object):
+    """
+    Lazy, Django-queryset-like wrapper around Solr search results.
+    Building a Queryset (filter, exclude, search, order_by, only) never
+    sends anything to Solr; requests are made only when you index,
+    slice, iterate, or count it. The total number of hits (numFound)
+    from any response is remembered, so counting a Queryset that has
+    already fetched results doesn't take another request.
+    """
     def __init__(self, url=None, using='default', page_by=100, conn=None,
                  **kwargs):
         self._conn = conn or connect(url=url, using=using, **kwargs)
@@ -57,6 +214,7 @@ class Queryset(object):
         self._result_offset = 0
         self._search_params = {'q': '*:*'}
         self._full_response = None
+        self._hits = None
         self.page_by = page_by
         kwargs['conn'] = self._conn
         kwargs['page_by'] = page_by
@@ -64,12 +222,15 @@ class Queryset(object):
 
     def __getitem__(self, key):
         if isinstance(key, slice):
-            start = key.start
-            new_key = key.start - self._result_offset
-            rows = key.stop - key.start
-            r = self._conn.search(start=start, rows=rows,
-                                  **self._search_params)
-            self._full_response = r
+            start = key.start or 0
+            if key.stop is None:
+                stop = len(self)
+            else:
+                stop = key.stop
+            rows = stop - start
+            if rows <= 0 or (self._hits is not None and start >= self._hits):
+                return []
+            r = self._search(start=start, rows=rows)
             return [Result(i) for i in r]
 
         if key < 0:
@@ -82,18 +243,30 @@ class Queryset(object):
                 raise IndexError()
             return self._result_set[new_key]
         except IndexError:
+            if self._hits is not None and key >= self._hits:
+                raise IndexError('index out of range')
             rows = self.page_by
-            r = self._conn.search(start=key, rows=rows, **self._search_params)
+            r = self._search(start=key, rows=rows)
             self._set_cache(r, offset=key)
-            self._full_response = r
             if not self._result_set:
                 raise IndexError('index out of range')
             return self.__getitem__(key)
 
     def __len__(self):
-        r = self._conn.search(rows=0, **self._search_params)
+        if self._hits is None:
+            self._search(rows=0)
+        return self._hits
+
+    def _search(self, **kwargs):
+        """
+        Sends a search request to Solr using this Queryset's search
+        parameters plus kwargs. Remembers the response and its hit
+        count.
+        """
+        r = self._conn.search(**dict(self._search_params, **kwargs))
         self._full_response = r
-        return r.hits
+        self._hits = r.hits
+        return r
 
     def _set_cache(self, result, offset=0):
         self._result_offset = offset
@@ -107,8 +280,138 @@ class Queryset(object):
         clone._search_params = copy.deepcopy(self._search_params)
         clone._set_cache(None)
         clone._full_response = None
+        clone._hits = None
         return clone
 
+    def iterator(self, batch_size=1000, key=None):
+        """
+        Generator that yields every result in this Queryset, fetching
+        batch_size results per request and without caching anything on
+        the Queryset, so it works for iterating over very large result
+        sets. See keyset_page for how paging works.
+        """
+        cursor = None
+        while True:
+            results, cursor = self.keyset_page(cursor, batch_size, key)
+            for result in results:
+                yield result
+            if cursor is None:
+                return
+
+    def keyset_page(self, cursor=None, rows=100, key=None):
+        """
+        Fetches one page of rows results, starting at the given cursor
+        (None for the first page). Returns a tuple: (list of results,
+        cursor for the next page). The next cursor is None when there
+        are no more results. Cursors are JSON-serializable dicts; a
+        cursor that isn't one this method returned raises ValueError.
+
+        Paging with start/rows gets slower the deeper you go, since
+        Solr has to collect start+rows docs for each page, and the
+        version of Solr we use (4.5) predates cursorMark. So instead
+        this uses keyset paging: results are sorted on the Queryset's
+        sort fields plus the unique key field (key, which defaults to
+        settings.HAYSTACK_ID_FIELD), and each page is filtered to
+        start after the last result of the previous one (see
+        _keyset_filter). This only works if docs with no value for a
+        sort field sort last, so sorting on a field whose type doesn't
+        have sortMissingLast set (see sort_missing_last) raises
+        ValueError.
+        """
+        if rows < 1:
+            raise ValueError('rows must be at least 1.')
+        key = key or getattr(settings, 'HAYSTACK_ID_FIELD', 'id')
+        sort = [s.split() for s in self._search_params.get('sort', '')
+                .split(',') if s.strip()]
+        sort = [(s[0], (s[1:] or ['asc'])[0]) for s in sort if s[0] != key]
+        sort.append((key, 'asc'))
+        fields = [field for field, direction in sort]
+
+        last = None
+        if cursor is not None:
+            try:
+                last = cursor['last']
+                if (not isinstance(last, dict) or last.get(key) is None
+                        or set(last.keys()) != set(fields)
+                        or any([isinstance(v, (dict, list))
+                                for v in last.values()])):
+                    raise TypeError
+            except (KeyError, TypeError):
+                raise ValueError('Invalid cursor.')
+        for field in fields[:-1]:
+            if not sort_missing_last(self._conn, field):
+                raise ValueError('Cannot page by cursor when sorting on {}: '
+                                 'its field type does not have '
+                                 'sortMissingLast set.'.format(field))
+
+        fq = self._search_params.get('fq', [])
+        fq = [fq] if isinstance(fq, basestring) else list(fq)
+        if last is not None:
+            fq.append(self._keyset_filter(last, sort))
+        params = dict(self._search_params, fq=fq, rows=rows,
+                      sort=', '.join(['{} {}'.format(*s) for s in sort]))
+        params.pop('start', None)
+        fl = self._search_params.get('fl', None)
+        if fl:
+            fl = [fl] if isinstance(fl, basestring) else list(fl)
+            params['fl'] = fl + [f for f in fields if f not in fl]
+
+        docs = list(self._conn.search(**params))
+        results = [Result(doc) for doc in docs]
+        if len(docs) < rows:
+            return results, None
+        last = {f: self._cursor_value(docs[-1].get(f, None)) for f in fields}
+        return results, {'last': last}
+
+    def _cursor_value(self, val):
+        if isinstance(val, datetime):
+            return self._val_to_solr_str(val)
+        return val
+
+    def _keyset_filter(self, last, sort):
+        """
+        Returns an fq string matching docs that sort after the doc
+        last, for keyset_page. Sort is a list of (field, direction)
+        tuples ending with the unique key field. For sort fields f1,
+        f2 ... fn, a doc sorts after last if it sorts after last on
+        f1, or it equals last on f1 and sorts after it on f2, and so
+        on. Docs missing a field sort after docs that have it,
+        whichever the direction, so nothing sorts after a doc that's
+        missing the field, and a missing value only equals another
+        missing value. The filter is not cached, since each one is
+        only used once.
+        """
+        def quote(val):
+            return re.sub(r'(["\\])', r'\\\1', unicode(val))
+
+        def missing(field):
+            return u'(*:* -{}:[* TO *])'.format(field)
+
+        clauses, equal = [], []
+        for field, direction in sort:
+            val = last[field]
+            if val is None:
+                equal.append(missing(field))
+                continue
+            v = quote(val)
+            if direction == 'desc':
+                after = u'{}:[* TO "{}"}}'.format(field, v)
+            else:
+                after = u'{}:{{"{}" TO *]'.format(field, v)
+            if field != sort[-1][0]:
+                after = u'({} OR {})'.format(after, missing(field))
+            clauses.append(u' AND '.join(equal + [after]))
+            equal.append(u'{}:"{}"'.format(field, v))
+        return u'{{!cache=false}}{}'.format(
+            u' OR '.join([u'({})'.format(c) for c in clauses]))
+
+    def all(self):
+        """
+        Returns a fresh copy of this Queryset, without any results it
+        has cached.
+        """
+        return self._clone()
+
     def count(self):
         return len(self)
 
@@ -218,8 +521,9 @@ class Queryset(object):
 
     def exclude(self, **kwargs):
         old_fq = ' AND '.join(self._search_params.get('fq', []))
-        self._search_params['fq'] = []
-        clone = self._do_search_parameters(**kwargs)
+        clone = self._clone()
+        clone._search_params['fq'] = []
+        clone = clone._do_search_parameters(**kwargs)
         fq = ' AND '.join(clone._search_params['fq'])
         clone._search_params['fq'] = [old_fq, '-({})'.format(fq)]
         return clone
@@ -236,16 +540,13 @@ class Queryset(object):
         returns multiple objects.
         """
         result = self.filter(**kwargs)
-        try:
-            ret_value = result[0]
-        except IndexError:
-            ret_value = None
-        else:
-            if len(result) > 1:
-                msg = ('Multiple objects returned for query {} '
-                       ''.format(result._search_params))
-                raise MultipleObjectsReturned(msg)
-        return ret_value
+        # One request gets the first result and the total count.
+        results = result[0:1]
+        if len(result) > 1:
+            msg = ('Multiple objects returned for query {} '
+                   ''.format(result._search_params))
+            raise MultipleObjectsReturned(msg)
+        return results[0] if results else None
 
     def search(self, raw_query, params=None):
         clone = self._clone()
@@ -273,13 +574,39 @@ class Queryset(object):
             sort.append('{} {}'.format(field, direction))
         sort = ', '.join(sort)
         clone._search_params['sort'] = sort
-        try:
-            len(clone)
-        except pysolr.SolrError:
-            raise
         return clone
 
     def only(self, *fields):
         clone = self._clone()
         clone._search_params['fl'] = fields
         return clone
+
+
+lookup_cache = redisobjs.RedisLookupCache('solr_lookups',
+                                          settings.LOOKUP_CACHE_TIMEOUT)
+
+
+def _fetch_lookups(types):
+    lookups = {t: {} for t in types}
+    qs = Queryset().filter(type__in=types)
+    for r in qs.only('type', 'code', 'label').iterator():
+        try:
+            lookups[r['type']][r['code']] = r.get('label', None)
+        except KeyError:
+            pass
+    return lookups
+
+
+def get_lookups(types):
+    """
+    Returns a dict mapping each of the given Solr document types (e.g.
+    'Location', 'ItemStatus', 'Itype') to a dict of code => label for
+    documents of that type. Results are cached (see
+    utils.redisobjs.RedisLookupCache), so use clear_lookups() whenever
+    the underlying Solr documents change.
+    """
+    return lookup_cache.get_many(types, _fetch_lookups)
+
+
+def clear_lookups():
+    lookup_cache.invalidate()
@@ -0,0 +1,108 @@
+"""
+Tests classes and functions in `utils.solr`.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from utils import solr
+
+
+# FIXTURES AND TEST DATA
+# Fixtures used in the below tests can be found in
+# django/sierra/conftest.py: solr_conn
+
+@pytest.fixture
+def keyset_docs():
+    """
+    Docs with repeated and missing values for several sort fields, to
+    test keyset paging on them.
+    """
+    docs = []
+    for i in range(0, 30):
+        doc = {'haystack_id': 'test.{:02d}'.format(i)}
+        if i % 7:
+            doc['a_s'] = 'abc'[i % 3]
+        if i % 5:
+            doc['n_i'] = i % 4
+        if i % 6:
+            doc['b_s'] = ['x', 'y "q"', 'z'][i % 2]
+        if i % 4:
+            doc['d_dt'] = datetime(2015, 1 + i % 3, 1)
+        docs.append(doc)
+    return docs
+
+
+# TESTS
+
+@pytest.mark.parametrize('order_by', [
+    ('a_s', '-n_i', 'b_s'),
+    ('-n_i', 'a_s'),
+    ('-b_s', '-a_s', 'n_i'),
+    ('n_i',),
+    ('d_dt', 'a_s'),
+    ('-d_dt', '-n_i'),
+    (),
+])
+def test_queryset_iterator_walks_sort(order_by, keyset_docs, solr_conn):
+    """
+    Queryset.iterator should yield every doc exactly once, in the same
+    order Solr sorts them in (with the unique key as a tiebreaker), no
+    matter how many sort fields there are or in what direction, and
+    including docs missing values for some of the sort fields.
+    """
+    conn = solr_conn('haystack')
+    conn.add(keyset_docs)
+    qs = solr.Queryset(conn=conn).order_by(*order_by)
+    expected = qs.order_by(*(order_by + ('haystack_id',)))[0:len(keyset_docs)]
+    paged = [r['haystack_id'] for r in qs.iterator(batch_size=4)]
+    assert paged == [r['haystack_id'] for r in expected]
+    assert len(paged) == len(keyset_docs)
+
+
+@pytest.mark.parametrize('cursor', [
+    {},
+    {'last': 'test.01'},
+    {'last': {}},
+    {'last': {'haystack_id': None}},
+    {'last': {'haystack_id': 'test.01', 'a_s': ['a']}},
+    {'last': {'haystack_id': 'test.01', 'n_i': 1}},
+])
+def test_queryset_keyset_page_rejects_bad_cursors(cursor):
+    """
+    Queryset.keyset_page should raise a ValueError, without querying
+    Solr, if given a cursor it could not have returned for this
+    Queryset.
+    """
+    qs = solr.Queryset(conn=object()).order_by('a_s')
+    with pytest.raises(ValueError):
+        qs.keyset_page(cursor, 10)
+
+
+@pytest.mark.parametrize('field, expected', [
+    ('haystack_id', True),
+    ('n_i', True),
+    ('a_s', True),
+    ('d_dt', True),
+    ('checkout_date', True),
+    ('a_t', False),
+    ('not_in_schema', False),
+])
+def test_sort_missing_last(field, expected, solr_conn):
+    """
+    sort_missing_last should return True only for fields (including
+    dynamic fields) whose type has sortMissingLast set.
+    """
+    assert solr.sort_missing_last(solr_conn('haystack'), field) == expected
+
+
+def test_queryset_keyset_page_rejects_sort_missing_first(solr_conn):
+    """
+    Queryset.keyset_page should raise a ValueError if asked to sort on
+    a field where docs missing a value don't sort last, since it can't
+    page through those correctly.
+    """
+    qs = solr.Queryset(conn=solr_conn('haystack')).order_by('a_s', 'a_t')
+    with pytest.raises(ValueError):
+        qs.keyset_page(None, 10)
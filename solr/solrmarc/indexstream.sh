@@ -0,0 +1,19 @@
+#! /bin/bash
+# indexstream.sh
+# Runs stanford solrmarc as a long-lived process that indexes MARC
+# records read from stdin, until stdin is closed. Logging is set up
+# via stream_log4j.properties to print a line for each record indexed,
+# so the caller can tell when solrmarc has finished a batch.
+
+CONFIG_FNAME=$1
+
+# set up directories
+DIST_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+SITE_JAR=$DIST_DIR/StanfordSearchWorksSolrMarc.jar
+CP=$SITE_JAR:$DIST_DIR:$DIST_DIR/lib
+CONFIG=$DIST_DIR/$CONFIG_FNAME
+LOG_CONFIG=file:$DIST_DIR/stream_log4j.properties
+
+# exec, so that stopping this script stops java
+exec java -Xmx1g -Dsolr.commit_at_end="false" \
+    -Dlog4j.configuration=$LOG_CONFIG -cp $CP -jar $SITE_JAR $CONFIG /dev/stdin